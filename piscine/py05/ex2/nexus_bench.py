@@ -0,0 +1,332 @@
+"""Benchmark harness for nexus_pipeline.
+
+Run from this directory:
+
+    python3 -m nexus_bench --records 20000 --json results.json
+    python3 -m nexus_bench --save-baseline baseline.json
+    python3 -m nexus_bench --baseline baseline.json
+
+Every scenario reports records/sec, latency percentiles (per record,
+or per batch for the batch scenarios) and the process's peak RSS so
+far. Inputs come from a seeded RNG, so runs are comparable; the best
+of --repeat runs is kept to damp scheduler noise. With --baseline the
+exit status is 1 when any scenario's throughput drops by more than
+--tolerance.
+"""
+import argparse
+from contextlib import redirect_stdout
+import io
+import json
+import platform
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from nexus_pipeline import (
+    PERCENTILES, CircuitBreaker, CSVAdapter, FailingTransformStage,
+    InputStage, JSONAdapter, NexusManager, OutputStage, SafeTransformStage,
+    StreamAdapter, get_json_codec, np, summarize_readings
+)
+
+SEED = 42
+DEFAULT_RECORDS = 10000
+DEFAULT_REPEAT = 3
+DEFAULT_BATCH_SIZES = (1, 16, 64, 256)
+DEFAULT_TOLERANCE = 0.10
+READINGS_PER_RECORD = 16
+CHAIN_IDS = ["PIPE_JSON", "PIPE_JSON", "PIPE_JSON"]
+SENSORS = ("temp", "humidity", "pressure")
+ACTIONS = ("login", "logout", "view", "purchase")
+
+
+def peak_rss_kb() -> Optional[int]:
+    """Peak resident set size of this process in KiB, if available."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss //= 1024
+    return int(rss)
+
+
+def json_records(n: int, rng: random.Random) -> List[str]:
+    return [
+        json.dumps({
+            "sensor": rng.choice(SENSORS),
+            "value": round(rng.uniform(0.0, 40.0), 2),
+            "unit": "C",
+        })
+        for _ in range(n)
+    ]
+
+
+def csv_records(n: int, rng: random.Random) -> List[str]:
+    return [
+        f"user{rng.randrange(1000)},{rng.choice(ACTIONS)},"
+        f"{1700000000 + i}"
+        for i in range(n)
+    ]
+
+
+def stream_records(n: int, rng: random.Random) -> List[List[float]]:
+    return [
+        [rng.gauss(22.0, 0.5) for _ in range(READINGS_PER_RECORD)]
+        for _ in range(n)
+    ]
+
+
+def make_result(
+    count: int,
+    elapsed: float,
+    latencies: List[float],
+) -> Dict[str, Any]:
+    summary = summarize_readings(latencies)
+    return {
+        "records": count,
+        "seconds": elapsed,
+        "records_per_sec": count / elapsed if elapsed > 0 else 0.0,
+        "latency_us": {
+            f"p{p}": summary[f"p{p}"] * 1e6 for p in PERCENTILES
+        },
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def measure(
+    records: Sequence[Any],
+    run_one: Callable[[Any], Any],
+    repeat: int,
+) -> Dict[str, Any]:
+    """Time run_one on every record; keep the fastest of repeat runs."""
+    clock = time.perf_counter
+    best: Optional[float] = None
+    best_latencies: List[float] = []
+    for _ in range(repeat):
+        latencies = []
+        start = clock()
+        for record in records:
+            t = clock()
+            run_one(record)
+            latencies.append(clock() - t)
+        elapsed = clock() - start
+        if best is None or elapsed < best:
+            best, best_latencies = elapsed, latencies
+    return make_result(len(records), best or 0.0, best_latencies)
+
+
+def measure_batches(
+    records: Sequence[Any],
+    run_batch: Callable[[List[Any]], Any],
+    batch_size: int,
+    repeat: int,
+) -> Dict[str, Any]:
+    """Like measure(), but feeds batch_size records per call."""
+    batches = [
+        list(records[i:i + batch_size])
+        for i in range(0, len(records), batch_size)
+    ]
+    result = measure(batches, run_batch, repeat)
+    result["records"] = len(records)
+    if result["seconds"] > 0:
+        result["records_per_sec"] = len(records) / result["seconds"]
+    result["batch_size"] = batch_size
+    return result
+
+
+def build_manager() -> NexusManager:
+    manager = NexusManager()
+    manager.register(JSONAdapter("PIPE_JSON"))
+    manager.register(CSVAdapter("PIPE_CSV"))
+    manager.register(StreamAdapter("PIPE_STREAM"))
+    for pipeline_id in ("PIPE_JSON_FAIL", "PIPE_JSON_FAIL_OPEN"):
+        failing = JSONAdapter(pipeline_id)
+        failing.stages = [
+            InputStage(), FailingTransformStage(), OutputStage()
+        ]
+        manager.register(failing)
+    # "recovery" measures failure-then-backup on every record, so its
+    # breaker must never open; "recovery_open" keeps the default one,
+    # which opens after a few failures and skips the primary.
+    manager.breakers["PIPE_JSON_FAIL"] = CircuitBreaker(min_calls=10**9)
+    return manager
+
+
+def run_suite(
+    records: int = DEFAULT_RECORDS,
+    repeat: int = DEFAULT_REPEAT,
+    batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES,
+    seed: int = SEED,
+) -> Dict[str, Any]:
+    """Run every scenario and return JSON-serialisable results."""
+    rng = random.Random(seed)
+    jsons = json_records(records, rng)
+    csvs = csv_records(records, rng)
+    streams = stream_records(records, rng)
+    parsed = [json.loads(record) for record in jsons]
+
+    manager = build_manager()
+    backup = JSONAdapter("PIPE_JSON_BACKUP")
+    backup.stages = [InputStage(), SafeTransformStage(), OutputStage()]
+
+    def chain(record: Dict[str, Any]) -> Any:
+        ctx = {"kind": "json", "raw": "record", "parsed": record}
+        return manager.chain_context(CHAIN_IDS, ctx)
+
+    def recover(record: Dict[str, Any], primary: str) -> Any:
+        ctx = {"kind": "json", "raw": "record", "parsed": record}
+        return manager.run_with_recovery(
+            primary, ctx, backup_pipeline=backup
+        )
+
+    results: Dict[str, Dict[str, Any]] = {}
+    results["json"] = measure(
+        jsons, lambda r: manager.run_pipeline("PIPE_JSON", r), repeat
+    )
+    pruned = JSONAdapter("PIPE_JSON_PRUNED")
+    pruned.prune()
+    results["json_pruned"] = measure(jsons, pruned.process, repeat)
+    results["json_bytes"] = measure(
+        [record.encode() for record in jsons],
+        lambda r: manager.run_pipeline("PIPE_JSON", r), repeat,
+    )
+    results["csv"] = measure(
+        csvs, lambda r: manager.run_pipeline("PIPE_CSV", r), repeat
+    )
+    results["stream"] = measure(
+        streams, lambda r: manager.run_pipeline("PIPE_STREAM", r), repeat
+    )
+    results["chain_x3"] = measure(parsed, chain, repeat)
+    # Recovery prints its progress; keep it out of the report.
+    with redirect_stdout(io.StringIO()):
+        results["recovery"] = measure(
+            parsed, lambda r: recover(r, "PIPE_JSON_FAIL"), repeat
+        )
+        results["recovery_open"] = measure(
+            parsed, lambda r: recover(r, "PIPE_JSON_FAIL_OPEN"), repeat
+        )
+
+    json_pipeline = manager.pipelines["PIPE_JSON"]
+    for size in batch_sizes:
+        results[f"json_batch_{size}"] = measure_batches(
+            jsons, json_pipeline.process_batch, size, repeat
+        )
+        results[f"json_columns_{size}"] = measure_batches(
+            jsons, json_pipeline.process_columns, size, repeat
+        )
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "numpy": np is not None,
+            "json_codec": get_json_codec().name,
+            "records": records,
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[str]:
+    """Return a message for every scenario slower than the baseline."""
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        cur = current["results"].get(name)
+        if cur is None:
+            continue
+        floor = base["records_per_sec"] * (1.0 - tolerance)
+        if cur["records_per_sec"] < floor:
+            drop = 1.0 - cur["records_per_sec"] / base["records_per_sec"]
+            regressions.append(
+                f"{name}: {cur['records_per_sec']:.0f} rec/s vs baseline "
+                f"{base['records_per_sec']:.0f} rec/s (-{drop:.0%})"
+            )
+    return regressions
+
+
+def format_report(suite: Dict[str, Any]) -> str:
+    lines = [
+        f"{'scenario':<16}{'rec/s':>12}{'p50 us':>10}"
+        f"{'p95 us':>10}{'p99 us':>10}{'rss KiB':>10}"
+    ]
+    for name, r in suite["results"].items():
+        lat = r["latency_us"]
+        rss = r["peak_rss_kb"] if r["peak_rss_kb"] is not None else "-"
+        lines.append(
+            f"{name:<16}{r['records_per_sec']:>12.0f}{lat['p50']:>10.1f}"
+            f"{lat['p95']:>10.1f}{lat['p99']:>10.1f}{rss:>10}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="nexus_bench", description="Benchmark the Nexus pipelines."
+    )
+    parser.add_argument("--records", type=int, default=DEFAULT_RECORDS)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument(
+        "--batch-sizes",
+        default=",".join(str(size) for size in DEFAULT_BATCH_SIZES),
+        help="comma-separated batch sizes for the batch scenarios",
+    )
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument(
+        "--json", metavar="PATH", help="write results as JSON ('-': stdout)"
+    )
+    parser.add_argument("--baseline", metavar="PATH")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument(
+        "--tolerance", type=float, default=DEFAULT_TOLERANCE,
+        help="allowed throughput drop vs the baseline (fraction)",
+    )
+    args = parser.parse_args(argv)
+    if args.records < 1 or args.repeat < 1:
+        parser.error("--records and --repeat must be >= 1")
+    try:
+        batch_sizes = [int(s) for s in args.batch_sizes.split(",") if s]
+    except ValueError:
+        parser.error("--batch-sizes must be comma-separated integers")
+    if any(size < 1 for size in batch_sizes):
+        parser.error("--batch-sizes must be >= 1")
+    if not 0.0 <= args.tolerance < 1.0:
+        parser.error("--tolerance must be in [0, 1)")
+
+    suite = run_suite(args.records, args.repeat, batch_sizes, args.seed)
+    encoded = json.dumps(suite, indent=2)
+    if args.json == "-":
+        print(encoded)
+    else:
+        print(format_report(suite))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                f.write(encoded + "\n")
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(encoded + "\n")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(suite, baseline, args.tolerance)
+        for msg in regressions:
+            print(f"REGRESSION {msg}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,226 +1,4326 @@
 from abc import ABC, abstractmethod
-from collections import deque
-from dataclasses import dataclass
+from array import array
+import asyncio
+import copy
+from collections import OrderedDict, deque
+from concurrent.futures import (
+    FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor,
+    ThreadPoolExecutor, wait
+)
+from dataclasses import dataclass, field
+from itertools import islice
+import hashlib
+import inspect
 import json
+import logging
+import math
+import mmap
+import os
+import pickle
+import shutil
+import struct
+import sys
+import threading
 import time
 import io
-from contextlib import redirect_stdout
-from typing import Any, Dict, List, Optional, Protocol, Union
+import csv
+import traceback
+from typing import (
+    Any, AsyncIterable, AsyncIterator, Callable, Dict, FrozenSet, Iterable,
+    Iterator, List, Optional, Protocol, Sequence, Set, Tuple, Union
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+Step = Callable[[Any], Any]
+PERCENTILES = (50, 95, 99)
+NUMPY_MIN_READINGS = 256
+JSON_RECORD_FIELDS = ("sensor", "value", "unit")
+BYTES_LIKE = (bytes, bytearray, memoryview)
+
+
+def is_numeric_buffer(readings: Any) -> bool:
+    """Return True for array.array, memoryview or NumPy array readings."""
+    if isinstance(readings, (array, memoryview)):
+        return True
+    return np is not None and isinstance(readings, np.ndarray)
+
+
+def summarize_readings(readings: Any) -> Dict[str, Any]:
+    """Return count, avg, min/max, variance and percentiles of readings.
+
+    With NumPy the readings are viewed as float64 without copying when
+    they already are a float64 buffer; otherwise (and for windows too
+    small to amortise NumPy's call overhead) a pure-Python path sorts
+    once and derives every figure from the sorted values.
+    """
+    if np is not None and (
+        isinstance(readings, np.ndarray)
+        or len(readings) >= NUMPY_MIN_READINGS
+    ):
+        values = np.asarray(readings, dtype=np.float64).ravel()
+        if values.size == 0:
+            raise ValueError("No numeric readings in stream")
+        mean = float(values.mean())
+        pcts = np.percentile(values, PERCENTILES)
+        summary = {
+            "count": int(values.size),
+            "avg": mean,
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "variance": float(values.var()),
+        }
+        for p, v in zip(PERCENTILES, pcts):
+            summary[f"p{p}"] = float(v)
+        return summary
+
+    ordered = sorted(map(float, readings))
+    n = len(ordered)
+    if n == 0:
+        raise ValueError("No numeric readings in stream")
+    mean = math.fsum(ordered) / n
+    summary = {
+        "count": n,
+        "avg": mean,
+        "min": ordered[0],
+        "max": ordered[-1],
+        "variance": math.fsum([(x - mean) ** 2 for x in ordered]) / n,
+    }
+    for p in PERCENTILES:
+        # Linear interpolation between closest ranks, as NumPy does.
+        rank = (n - 1) * p / 100
+        lo = int(rank)
+        hi = min(lo + 1, n - 1)
+        summary[f"p{p}"] = (
+            ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+        )
+    return summary
+
+
+class LatencyHistogram:
+    """Fixed-memory latency histogram with log-spaced buckets.
+
+    Each power-of-two octave from 2**-24 s (~60ns) up to 2**10 s (~17
+    minutes) is split into SUB linear buckets (at most 25% wide);
+    outliers and zero durations are clamped into the first/last bucket.
+    Bucketing uses math.frexp, so a sample costs a few hundred
+    nanoseconds. Percentiles report the bucket's upper bound, or max
+    for the last bucket.
+    """
+    SUB = 4
+    MIN_EXP = -23
+    BUCKETS = 4 * 34
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, dt: float) -> None:
+        mantissa, exp = math.frexp(dt)
+        i = (exp - self.MIN_EXP) * self.SUB + int(
+            (mantissa - 0.5) * 2 * self.SUB
+        )
+        # frexp(0.0) has exponent 0, which would land mid-range.
+        if i < 0 or dt <= 0:
+            i = 0
+        elif i >= self.BUCKETS:
+            i = self.BUCKETS - 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += dt
+        if dt > self.max:
+            self.max = dt
+
+    def upper_bound(self, i: int) -> float:
+        exp, sub = divmod(i, self.SUB)
+        return math.ldexp(0.5 + (sub + 1) / (2 * self.SUB),
+                          exp + self.MIN_EXP)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for i, n in enumerate(other.counts):
+            if n:
+                self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def snapshot(self) -> "LatencyHistogram":
+        return self.from_dict(self.to_dict())
+
+    def since(self, earlier: "LatencyHistogram") -> "LatencyHistogram":
+        """The samples recorded after the snapshot earlier was taken.
+
+        max is not tracked per interval, so the result keeps this
+        histogram's max as a bound.
+        """
+        delta = self.snapshot()
+        for i, n in enumerate(earlier.counts):
+            if n:
+                delta.counts[i] -= n
+        delta.count -= earlier.count
+        delta.total -= earlier.total
+        return delta
+
+    def percentile(self, q: float) -> float:
+        """Approximate q-th percentile (0-100) in seconds."""
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                if i == self.BUCKETS - 1:
+                    return self.max
+                return min(self.upper_bound(i), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "counts": list(self.counts),
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "LatencyHistogram":
+        hist = cls()
+        counts = list(state["counts"])
+        if len(counts) < cls.BUCKETS:
+            # Snapshots taken with fewer buckets: the same low buckets.
+            counts += [0] * (cls.BUCKETS - len(counts))
+        hist.counts = counts
+        hist.count = state["count"]
+        hist.total = state["total"]
+        hist.max = state["max"]
+        return hist
+
+    def summary(self) -> str:
+        return (
+            f"n={self.count}, "
+            f"p50={self.percentile(50) * 1e6:.1f}us, "
+            f"p95={self.percentile(95) * 1e6:.1f}us, "
+            f"p99={self.percentile(99) * 1e6:.1f}us, "
+            f"max={self.max * 1e6:.1f}us"
+        )
 
 
 @dataclass
 class PipelineStats:
-    """Collect pipeline timing and error statistics."""
+    """Collect pipeline timing and error statistics.
+
+    One run in sample_every (0 disables) is timed stage by stage into
+    stage_latency and end to end into run_latency; batch runs record
+    mean per-record latencies. Unsampled runs only bump the counters.
+    Every run of the batch entry points also records its whole time
+    into batch_latency.
+    """
     pipeline_id: str
     pipeline_type: str
     processed_batches: int = 0
+    processed_records: int = 0
     error_count: int = 0
     total_time_sec: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    sample_every: int = 100
+    run_latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    batch_latency: LatencyHistogram = field(
+        default_factory=LatencyHistogram
+    )
+    stage_latency: Dict[str, LatencyHistogram] = field(default_factory=dict)
+    _sample_countdown: int = field(default=0, repr=False, compare=False)
 
-    def add_run(self, dt: float, ok: bool) -> None:
-        """Record one run duration and whether it succeeded."""
+    def add_run(
+        self,
+        dt: float,
+        ok: bool,
+        records: int = 1,
+        batch: bool = False,
+    ) -> None:
+        """Record one run (of one or more records) and its outcome."""
         self.processed_batches += 1
+        self.processed_records += records
         self.total_time_sec += dt
+        if batch:
+            self.batch_latency.record(dt)
         if not ok:
             self.error_count += 1
 
-    def efficiency(self) -> float:
-        """Return success rate as a float in [0, 1]."""
-        if self.processed_batches == 0:
-            return 1.0
-        return 1.0 - (self.error_count / self.processed_batches)
+    def sample(self) -> bool:
+        """Return True for the runs whose stages should be timed."""
+        if self.sample_every <= 0:
+            return False
+        self._sample_countdown -= 1
+        if self._sample_countdown > 0:
+            return False
+        self._sample_countdown = self.sample_every
+        return True
+
+    def record_stage(self, name: str, dt: float) -> None:
+        hist = self.stage_latency.get(name)
+        if hist is None:
+            hist = self.stage_latency[name] = LatencyHistogram()
+        hist.record(dt)
+
+    def merge(self, other: "PipelineStats") -> None:
+        """Fold counters collected elsewhere (e.g. a worker) into these."""
+        self.processed_batches += other.processed_batches
+        self.processed_records += other.processed_records
+        self.error_count += other.error_count
+        self.total_time_sec += other.total_time_sec
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.run_latency.merge(other.run_latency)
+        self.batch_latency.merge(other.batch_latency)
+        for name, hist in other.stage_latency.items():
+            if name in self.stage_latency:
+                self.stage_latency[name].merge(hist)
+            else:
+                self.stage_latency[name] = hist
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Counters and histograms as JSON-serialisable data."""
+        return {
+            "processed_batches": self.processed_batches,
+            "processed_records": self.processed_records,
+            "error_count": self.error_count,
+            "total_time_sec": self.total_time_sec,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "run_latency": self.run_latency.to_dict(),
+            "batch_latency": self.batch_latency.to_dict(),
+            "stage_latency": {
+                name: hist.to_dict()
+                for name, hist in self.stage_latency.items()
+            },
+        }
+
+    def load(self, state: Dict[str, Any]) -> None:
+        """Replace counters and histograms with a to_dict() snapshot."""
+        self.processed_batches = state["processed_batches"]
+        self.processed_records = state["processed_records"]
+        self.error_count = state["error_count"]
+        self.total_time_sec = state["total_time_sec"]
+        self.cache_hits = state["cache_hits"]
+        self.cache_misses = state["cache_misses"]
+        self.run_latency = LatencyHistogram.from_dict(state["run_latency"])
+        # Checkpoints written before batch_latency existed lack it.
+        batch = state.get("batch_latency")
+        self.batch_latency = (
+            LatencyHistogram() if batch is None
+            else LatencyHistogram.from_dict(batch)
+        )
+        self.stage_latency = {
+            name: LatencyHistogram.from_dict(hist)
+            for name, hist in state["stage_latency"].items()
+        }
+
+    def efficiency(self) -> float:
+        """Return success rate as a float in [0, 1]."""
+        if self.processed_batches == 0:
+            return 1.0
+        return 1.0 - (self.error_count / self.processed_batches)
+
+
+_MISSING: Any = object()
+
+
+class PipelineContext:
+    """Slotted per-record context that compiled stage steps operate on.
+
+    The fixed fields are plain attributes; unset ones hold _MISSING.
+    Dict-style access (get, [], in, to_dict) keeps dict-based stages
+    and callers working; keys outside FIELDS live in `extra`.
+    """
+    FIELDS = (
+        "kind", "raw", "parsed", "validated",
+        "metadata", "transformed", "output",
+    )
+    __slots__ = FIELDS + ("extra",)
+    _FIELD_SET = frozenset(FIELDS)
+
+    def __init__(
+        self,
+        kind: Any = _MISSING,
+        raw: Any = _MISSING,
+        parsed: Any = _MISSING,
+    ) -> None:
+        self.kind = kind
+        self.raw = raw
+        self.parsed = parsed
+        self.validated: Any = _MISSING
+        self.metadata: Any = _MISSING
+        self.transformed: Any = _MISSING
+        self.output: Any = _MISSING
+        self.extra: Optional[Dict[str, Any]] = None
+
+    def reset(self) -> None:
+        """Clear every field so the object can be reused."""
+        self.kind = self.raw = self.parsed = _MISSING
+        self.validated = self.metadata = _MISSING
+        self.transformed = self.output = _MISSING
+        self.extra = None
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELD_SET:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in self._FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self[key]  # type: ignore[index]
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is not _MISSING:
+                data[name] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def load(self, data: Dict[str, Any]) -> None:
+        """Replace every field with the contents of a dict context."""
+        self.reset()
+        for key, value in data.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PipelineContext":
+        context = cls()
+        context.load(data)
+        return context
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # _MISSING is identity-based, so pickle through a plain dict.
+        return (PipelineContext.from_dict, (self.to_dict(),))
+
+    def __repr__(self) -> str:
+        return f"PipelineContext({self.to_dict()!r})"
+
+
+class ContextPool:
+    """Free list of PipelineContext objects reused across records."""
+    def __init__(self, max_size: int = 256) -> None:
+        self.max_size = max_size
+        self.free: List[PipelineContext] = []
+
+    def acquire(self, kind: Any, raw: Any, parsed: Any) -> PipelineContext:
+        if self.free:
+            context = self.free.pop()
+            context.kind = kind
+            context.raw = raw
+            context.parsed = parsed
+            return context
+        return PipelineContext(kind, raw, parsed)
+
+    def release(self, context: PipelineContext) -> None:
+        """Return a context whose results are no longer referenced."""
+        if len(self.free) < self.max_size:
+            context.reset()
+            self.free.append(context)
+
+
+class ResultCache:
+    """Bounded LRU cache of outputs keyed by a digest of the raw input.
+
+    Only str/bytes inputs are cached. Entries older than ttl seconds
+    (if set) count as misses. Meant for idempotent pipelines: a hit
+    skips every stage, including stateful ones. Safe to share between
+    threads; get() can count hits and misses into a PipelineStats
+    under the same lock.
+    """
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.entries: OrderedDict[bytes, Tuple[float, str]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, data: Any) -> Optional[bytes]:
+        """Digest of a raw input, or None if it cannot be cached."""
+        if isinstance(data, str):
+            data = data.encode("utf-8", errors="surrogatepass")
+        elif not isinstance(data, BYTES_LIKE):
+            return None
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def get(
+        self,
+        key: bytes,
+        stats: Optional["PipelineStats"] = None,
+    ) -> Optional[str]:
+        with self.lock:
+            output = self._get(key)
+            if stats is not None:
+                if output is None:
+                    stats.cache_misses += 1
+                else:
+                    stats.cache_hits += 1
+            return output
+
+    def _get(self, key: bytes) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, output = entry
+        if self.ttl is not None and self.clock() - stored_at > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return output
+
+    def put(self, key: bytes, output: str) -> None:
+        with self.lock:
+            self.entries[key] = (self.clock(), output)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+
+TRACE_OFF = logging.CRITICAL + 10
+
+
+@dataclass
+class TraceEvent:
+    """One structured event emitted by a stage."""
+    timestamp: float
+    level: int
+    stage: str
+    kind: Any
+    message: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": self.timestamp,
+            "level": logging.getLevelName(self.level),
+            "stage": self.stage,
+            "kind": self.kind,
+            "message": self.message,
+        }
+
+
+class TraceSink(ABC):
+    """Base trace sink: events below level are dropped.
+
+    Stages check `sink.level <= level` before calling emit(), so a
+    disabled sink costs one attribute read and comparison per record.
+    """
+    def __init__(self, level: int = logging.INFO) -> None:
+        self.level = level
+
+    def emit(self, level: int, stage: str, kind: Any, message: str) -> None:
+        if level >= self.level:
+            self.write(TraceEvent(time.time(), level, stage, kind, message))
+
+    @abstractmethod
+    def write(self, event: TraceEvent) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class NullTraceSink(TraceSink):
+    """Default sink: tracing disabled."""
+    def __init__(self) -> None:
+        super().__init__(TRACE_OFF)
+
+    def emit(self, level: int, stage: str, kind: Any, message: str) -> None:
+        pass
+
+    def write(self, event: TraceEvent) -> None:
+        pass
+
+
+class ConsoleTraceSink(TraceSink):
+    """Print event messages to stdout."""
+    def write(self, event: TraceEvent) -> None:
+        print(event.message)
+
+
+class RingBufferTraceSink(TraceSink):
+    """Keep the last capacity events in memory."""
+    def __init__(self, capacity: int = 1024, level: int = logging.DEBUG):
+        super().__init__(level)
+        self.events: deque = deque(maxlen=capacity)
+
+    def write(self, event: TraceEvent) -> None:
+        self.events.append(event)
+
+
+class FileTraceSink(TraceSink):
+    """Append events to a file as JSON lines.
+
+    The file is opened lazily, so the sink can be pickled into worker
+    processes; each worker then appends to the same path.
+    """
+    def __init__(self, path: str, level: int = logging.INFO) -> None:
+        super().__init__(level)
+        self.path = path
+        self.fileobj: Optional[Any] = None
+        self.lock = threading.Lock()
+
+    def write(self, event: TraceEvent) -> None:
+        line = json.dumps(event.to_dict(), default=str) + "\n"
+        with self.lock:
+            if self.fileobj is None:
+                self.fileobj = open(self.path, "a", encoding="utf-8")
+            self.fileobj.write(line)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.fileobj is not None:
+                self.fileobj.close()
+                self.fileobj = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["fileobj"] = None
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+
+class LoggingTraceSink(TraceSink):
+    """Forward events to a logging.Logger, with stage and kind as extras."""
+    def __init__(
+        self,
+        logger: Union[str, logging.Logger] = "nexus",
+        level: int = logging.INFO,
+    ) -> None:
+        super().__init__(level)
+        if isinstance(logger, str):
+            logger = logging.getLogger(logger)
+        self.logger = logger
+
+    def emit(self, level: int, stage: str, kind: Any, message: str) -> None:
+        if level >= self.level and self.logger.isEnabledFor(level):
+            self.logger.log(
+                level, message, extra={"stage": stage, "kind": kind}
+            )
+
+    def write(self, event: TraceEvent) -> None:
+        self.emit(event.level, event.stage, event.kind, event.message)
+
+
+NULL_TRACE = NullTraceSink()
+
+
+class ProcessingStage(Protocol):
+    """Duck-typed stage interface: any object with process(data) is a stage."""
+    def process(self, data: Any) -> Any:
+        ...
+
+
+class CompilableStage(ProcessingStage, Protocol):
+    """Optional stage extension: specialise process() for a single kind.
+
+    The returned step takes and returns a PipelineContext.
+    """
+    def compile(self, kind: str) -> Optional[Step]:
+        ...
+
+
+class BatchProcessingStage(ProcessingStage, Protocol):
+    """Optional stage extension: handle a whole list of contexts at once."""
+    def process_batch(self, batch: List[Any]) -> List[Any]:
+        ...
+
+
+class ColumnarStage(ProcessingStage, Protocol):
+    """Optional stage extension: handle a whole batch as column arrays.
+
+    A column batch is a dict with "kind" (one for the whole batch),
+    "size", "raw" (a list), "parsed" (names of the input columns) and
+    "columns" (name -> list, array.array or NumPy array of length
+    size). Stages add to it, e.g. "metadata", "transformed" (names of
+    the transformed columns) and "output" (a list of str). Only kinds
+    listed in column_kinds are handed to process_columns().
+    """
+    column_kinds: Tuple[str, ...]
+
+    def process_columns(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+
+class DeclaredStage(ProcessingStage, Protocol):
+    """Optional stage extension: declare the context fields used.
+
+    reads/writes name context keys. Fields in optional_writes are pure
+    side output: the pipeline puts those nobody downstream reads into
+    skip_writes (see ProcessingPipeline.prune) and the stage must then
+    not produce them. A stage without reads is assumed to read every
+    field.
+    """
+    reads: Tuple[str, ...]
+    writes: Tuple[str, ...]
+    optional_writes: Tuple[str, ...]
+    skip_writes: FrozenSet[str]
+
+
+class InputStage:
+    """Stage 1: validate the shared context structure."""
+    column_kinds = ("json", "csv", "stream")
+    reads = ("kind", "raw", "parsed")
+    writes = ("validated",)
+
+    def process(self, data: Any) -> Any:
+        if not isinstance(data, dict):
+            raise ValueError("InputStage expects a dict context")
+
+        required = ("kind", "raw", "parsed")
+        if any(k not in data for k in required):
+            raise ValueError("Missing required context keys: kind/raw/parsed")
+
+        data["validated"] = True
+        return data
+
+    def process_batch(self, batch: List[Any]) -> List[Any]:
+        for data in batch:
+            self.process(data)
+        return batch
+
+    def compile(self, kind: str) -> Optional[Step]:
+        """Return a step for contexts already known to be of kind."""
+        def step(context: PipelineContext) -> PipelineContext:
+            if context.raw is _MISSING or context.parsed is _MISSING:
+                raise ValueError(
+                    "Missing required context keys: kind/raw/parsed"
+                )
+            context.validated = True
+            return context
+        return step
+
+    def process_columns(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        columns = batch.get("columns")
+        if not isinstance(columns, dict) or "kind" not in batch:
+            raise ValueError("Missing required column batch keys")
+        size = batch["size"]
+        if any(len(column) != size for column in columns.values()):
+            raise ValueError("Column lengths must match the batch size")
+        batch["validated"] = True
+        return batch
+
+
+class TransformStage:
+    """Stage 2: enrich and transform based on data kind."""
+    column_kinds = ("json",)
+    reads = ("kind", "parsed")
+    writes = ("metadata", "transformed")
+    optional_writes = ("metadata",)
+    skip_writes: FrozenSet[str] = frozenset()
+    MESSAGES = {
+        "json": "Transform: Enriched with metadata and validation",
+        "csv": "Transform: Parsed and structured data",
+        "stream": "Transform: Aggregated and filtered",
+    }
+
+    def __init__(
+        self,
+        verbose: bool = False,
+        trace: Optional[TraceSink] = None,
+    ) -> None:
+        self.verbose = verbose
+        if trace is None:
+            trace = ConsoleTraceSink() if verbose else NULL_TRACE
+        self.trace = trace
+        self.transforms: Dict[str, Callable[[Any], Dict[str, Any]]] = {
+            "json": self.transform_json,
+            "csv": self.transform_csv,
+            "stream": self.transform_stream,
+        }
+
+    def process(self, data: Any) -> Any:
+        if not isinstance(data, dict):
+            raise ValueError("TransformStage expects a dict context")
+
+        kind = data.get("kind")
+        if "metadata" not in self.skip_writes:
+            data["metadata"] = {"timestamp": time.time(), "enriched": True}
+        trace = self.trace
+        if trace.level <= logging.INFO and kind in self.MESSAGES:
+            trace.emit(
+                logging.INFO, type(self).__name__, kind, self.MESSAGES[kind]
+            )
+        data["transformed"] = self.transform(kind, data.get("parsed"))
+        return data
+
+    def process_batch(self, batch: List[Any]) -> List[Any]:
+        """Transform many contexts with one timestamp and event per kind."""
+        enrich = "metadata" not in self.skip_writes
+        stamp = time.time()
+        trace = self.trace
+        announced = set()
+        if trace.level > logging.INFO:
+            announced.update(self.MESSAGES)
+        for data in batch:
+            if not isinstance(data, dict):
+                raise ValueError("TransformStage expects a dict context")
+
+            kind = data.get("kind")
+            if enrich:
+                data["metadata"] = {"timestamp": stamp, "enriched": True}
+            if kind in self.MESSAGES and kind not in announced:
+                trace.emit(
+                    logging.INFO, type(self).__name__, kind,
+                    self.MESSAGES[kind],
+                )
+                announced.add(kind)
+            data["transformed"] = self.transform(kind, data.get("parsed"))
+        return batch
+
+    def compile(self, kind: str) -> Optional[Step]:
+        """Return a step specialised for one kind, or None if unknown."""
+        transform = self.transforms.get(kind)
+        if transform is None:
+            return None
+        message = self.MESSAGES.get(kind)
+        name = type(self).__name__
+        enrich = "metadata" not in self.skip_writes
+
+        def step(context: PipelineContext) -> PipelineContext:
+            if enrich:
+                context.metadata = {
+                    "timestamp": time.time(), "enriched": True
+                }
+            # Read self.trace per call so set_trace() needs no recompile.
+            trace = self.trace
+            if message is not None and trace.level <= logging.INFO:
+                trace.emit(logging.INFO, name, kind, message)
+            context.transformed = transform(context.parsed)
+            return context
+        return step
+
+    def process_columns(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """Transform a JSON column batch with one timestamp and event."""
+        kind = batch["kind"]
+        if kind not in self.column_kinds:
+            raise ValueError(f"No columnar transform for kind: {kind}")
+        size = batch["size"]
+        columns = batch["columns"]
+        if "metadata" not in self.skip_writes:
+            batch["metadata"] = {"timestamp": time.time(), "enriched": True}
+        trace = self.trace
+        if size and trace.level <= logging.INFO:
+            trace.emit(
+                logging.INFO, type(self).__name__, kind, self.MESSAGES[kind]
+            )
+
+        values = columns.get("value", [_MISSING] * size)
+        if not is_numeric_buffer(values):
+            if not all(
+                issubclass(t, (int, float)) for t in set(map(type, values))
+            ):
+                raise ValueError("JSON 'value' must be numeric")
+            if np is not None and size >= NUMPY_MIN_READINGS:
+                values = np.array(values, dtype=np.float64)
+            else:
+                values = array("d", values)
+        sensors = [
+            "unknown" if s is _MISSING else str(s)
+            for s in columns.get("sensor", [_MISSING] * size)
+        ]
+        units = [
+            "" if u is _MISSING else str(u)
+            for u in columns.get("unit", [_MISSING] * size)
+        ]
+        temp = [s.lower() in ("temp", "temperature") for s in sensors]
+        if np is not None and isinstance(values, np.ndarray):
+            mask = np.array(temp, dtype=bool)
+            status = np.where(
+                mask & (values <= 10), "Low",
+                np.where(mask & (values >= 30), "High", "Normal range"),
+            ).tolist()
+        else:
+            status = [
+                "Low" if t and v <= 10
+                else "High" if t and v >= 30
+                else "Normal range"
+                for t, v in zip(temp, values or ())
+            ]
+        columns["sensor"] = sensors
+        columns["value"] = values
+        columns["unit"] = units
+        columns["status"] = status
+        batch["transformed"] = ["sensor", "value", "unit", "status"]
+        return batch
+
+    def transform(self, kind: Any, parsed: Any) -> Dict[str, Any]:
+        """Build the transformed payload for one parsed record."""
+        transform = self.transforms.get(kind)
+        if transform is None:
+            raise ValueError(f"Unknown kind: {kind}")
+        return transform(parsed)
+
+    def transform_json(self, parsed: Any) -> Dict[str, Any]:
+        if not isinstance(parsed, dict):
+            raise ValueError("JSON parsed data must be a dict")
+
+        sensor = str(parsed.get("sensor", "unknown"))
+        value = parsed.get("value")
+        unit = str(parsed.get("unit", ""))
+
+        if not isinstance(value, (int, float)):
+            raise ValueError("JSON 'value' must be numeric")
+
+        status = "Normal range"
+        if sensor.lower() in ("temp", "temperature") and value >= 30:
+            status = "High"
+        if sensor.lower() in ("temp", "temperature") and value <= 10:
+            status = "Low"
+
+        return {
+            "sensor": sensor,
+            "value": float(value),
+            "unit": unit,
+            "status": status,
+        }
+
+    def transform_csv(self, parsed: Any) -> Dict[str, Any]:
+        if not isinstance(parsed, dict) or "fields" not in parsed:
+            raise ValueError("CSV parsed data must contain 'fields'")
+
+        fields = parsed["fields"]
+        if not isinstance(fields, list):
+            raise ValueError("CSV 'fields' must be a list")
+
+        transformed = {
+            "fields": [str(x).strip() for x in fields],
+            "actions_processed": int(parsed.get("rows", 1)),
+        }
+        if "columns" in parsed:
+            transformed["columns"] = parsed["columns"]
+        return transformed
+
+    def transform_stream(self, parsed: Any) -> Dict[str, Any]:
+        if not isinstance(parsed, dict) or "readings" not in parsed:
+            raise ValueError("Stream parsed must contain 'readings'")
+
+        readings = parsed["readings"]
+        if is_numeric_buffer(readings):
+            return summarize_readings(readings)
+        if not isinstance(readings, list):
+            raise ValueError("Stream 'readings' must be a list or buffer")
+
+        numeric = [x for x in readings if isinstance(x, (int, float))]
+        if not numeric:
+            raise ValueError("No numeric readings in stream")
+        return summarize_readings(numeric)
+
+
+class OutputStage:
+    """Stage 3: format a human-readable output string."""
+    column_kinds = ("json",)
+    reads = ("kind", "transformed")
+    writes = ("output",)
+
+    def __init__(self) -> None:
+        self.formatters: Dict[str, Callable[[Dict[str, Any]], str]] = {
+            "json": self.format_json,
+            "csv": self.format_csv,
+            "stream": self.format_stream,
+        }
+
+    def process(self, data: Any) -> Any:
+        if not isinstance(data, dict):
+            raise ValueError("OutputStage expects a dict context")
+
+        data["output"] = self.format(data.get("kind"), data.get("transformed"))
+        return data
+
+    def process_batch(self, batch: List[Any]) -> List[Any]:
+        for data in batch:
+            if not isinstance(data, dict):
+                raise ValueError("OutputStage expects a dict context")
+            data["output"] = self.format(
+                data.get("kind"), data.get("transformed")
+            )
+        return batch
+
+    def compile(self, kind: str) -> Optional[Step]:
+        """Return a step specialised for one kind, or None if unknown."""
+        formatter = self.formatters.get(kind)
+        if formatter is None:
+            return None
+
+        def step(context: PipelineContext) -> PipelineContext:
+            transformed = context.transformed
+            if not isinstance(transformed, dict):
+                raise ValueError("Missing transformed dict")
+            context.output = formatter(transformed)
+            return context
+        return step
+
+    def process_columns(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        kind = batch["kind"]
+        if kind not in self.column_kinds:
+            raise ValueError(f"No columnar output for kind: {kind}")
+        columns = batch["columns"]
+        if "transformed" not in batch or "status" not in columns:
+            raise ValueError("Missing transformed columns")
+        batch["output"] = [
+            f"Processed temperature reading: {value:.1f}°C ({status})"
+            for value, status in zip(columns["value"], columns["status"])
+        ]
+        return batch
+
+    def format(self, kind: Any, transformed: Any) -> str:
+        """Render the transformed payload of one record as text."""
+        if not isinstance(transformed, dict):
+            raise ValueError("Missing transformed dict")
+
+        formatter = self.formatters.get(kind)
+        if formatter is None:
+            raise ValueError(f"Unknown kind: {kind}")
+        return formatter(transformed)
+
+    def format_json(self, transformed: Dict[str, Any]) -> str:
+        value = float(transformed["value"])
+        status = transformed["status"]
+        return f"Processed temperature reading: {value:.1f}°C ({status})"
+
+    def format_csv(self, transformed: Dict[str, Any]) -> str:
+        count = int(transformed.get("actions_processed", 0))
+        return f"User activity logged: {count} actions processed"
+
+    def format_stream(self, transformed: Dict[str, Any]) -> str:
+        count = int(transformed["count"])
+        avg_val = float(transformed["avg"])
+        return f"Stream summary: {count} readings, avg: {avg_val:.1f}°C"
+
+
+class RunningStats:
+    """Welford running count/mean/variance plus min and max, O(1) each."""
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def remove(self, x: float) -> None:
+        """Undo add(x) for count/mean/variance; min/max are not touched."""
+        if self.count <= 1:
+            self.count = 0
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        self.count -= 1
+        delta = x - self.mean
+        self.mean -= delta / self.count
+        self.m2 = max(self.m2 - delta * (x - self.mean), 0.0)
+
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "RunningStats":
+        stats = cls()
+        for name in cls.__slots__:
+            setattr(stats, name, state[name])
+        return stats
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg": self.mean,
+            "variance": self.variance(),
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+
+class WindowedAggregateStage:
+    """Stateful stage keeping running window aggregates across records.
+
+    Readings come from parsed["readings"] (stream kind) or
+    transformed["value"] (JSON kind); their time is parsed["timestamp"]
+    when present, else clock(). Timestamps are assumed non-decreasing.
+    Modes:
+    - "tumbling": fixed, aligned windows of size_sec;
+    - "sliding": the last size_sec seconds, updated on every reading;
+    - "session": closed after gap_sec without readings.
+    Each record gets data["window"] (the open window) and
+    data["closed_windows"] (windows this record closed).
+    """
+    MODES = ("tumbling", "sliding", "session")
+    accepts_context = True
+    stateful = True
+    reads = ("parsed", "transformed")
+    writes = ("window", "closed_windows")
+
+    def __init__(
+        self,
+        mode: str = "tumbling",
+        size_sec: float = 300.0,
+        gap_sec: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown window mode: {mode}")
+        if mode == "session" and (gap_sec is None or gap_sec <= 0):
+            raise ValueError("Session windows need a positive gap_sec")
+        if mode != "session" and size_sec <= 0:
+            raise ValueError("size_sec must be > 0")
+        self.mode = mode
+        self.size_sec = size_sec
+        self.gap_sec = gap_sec
+        self.clock = clock
+        self.add = {
+            "tumbling": self._add_tumbling,
+            "sliding": self._add_sliding,
+            "session": self._add_session,
+        }[mode]
+        self.reset()
+
+    def reset(self) -> None:
+        self.stats = RunningStats()
+        self.start: Optional[float] = None
+        self.last: Optional[float] = None
+        # Sliding mode: every reading in the window plus monotonic
+        # queues so min/max stay O(1) amortised under eviction.
+        self.window: deque[Tuple[float, float]] = deque()
+        self.min_q: deque[Tuple[float, float]] = deque()
+        self.max_q: deque[Tuple[float, float]] = deque()
+
+    def process(self, data: Any) -> Any:
+        if not isinstance(data, (dict, PipelineContext)):
+            raise ValueError("WindowedAggregateStage expects a dict context")
+
+        parsed = data.get("parsed")
+        ts = None
+        if isinstance(parsed, dict):
+            ts = parsed.get("timestamp")
+        if ts is None:
+            ts = self.clock()
+
+        closed: List[Dict[str, Any]] = []
+        for x in self._readings(data):
+            self.add(float(ts), float(x), closed)
+        data["window"] = self.current()
+        data["closed_windows"] = closed
+        return data
+
+    def current(self) -> Dict[str, Any]:
+        """Summary of the window that is still open."""
+        summary = self.stats.summary()
+        if self.mode == "sliding" and self.window:
+            summary["min"] = self.min_q[0][1]
+            summary["max"] = self.max_q[0][1]
+        summary["mode"] = self.mode
+        summary["start"] = self.start
+        summary["end"] = self._end()
+        return summary
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        """Close and return the open window, e.g. at end of input."""
+        if self.stats.count == 0:
+            return None
+        summary = self.current()
+        self.reset()
+        return summary
+
+    def get_state(self) -> Dict[str, Any]:
+        """Open-window state as JSON-serialisable data, for checkpoints."""
+        return {
+            "mode": self.mode,
+            "stats": self.stats.to_dict(),
+            "start": self.start,
+            "last": self.last,
+            "window": list(self.window),
+            "min_q": list(self.min_q),
+            "max_q": list(self.max_q),
+        }
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        if state["mode"] != self.mode:
+            raise ValueError(
+                f"Window state is for mode '{state['mode']}', "
+                f"not '{self.mode}'"
+            )
+        self.stats = RunningStats.from_dict(state["stats"])
+        self.start = state["start"]
+        self.last = state["last"]
+        self.window = deque((ts, x) for ts, x in state["window"])
+        self.min_q = deque((ts, x) for ts, x in state["min_q"])
+        self.max_q = deque((ts, x) for ts, x in state["max_q"])
+
+    def _readings(self, data: Any) -> Iterable[Any]:
+        parsed = data.get("parsed")
+        if isinstance(parsed, dict) and "readings" in parsed:
+            readings = parsed["readings"]
+            if is_numeric_buffer(readings):
+                return readings
+            return [x for x in readings if isinstance(x, (int, float))]
+        transformed = data.get("transformed")
+        if isinstance(transformed, dict) and "value" in transformed:
+            return [transformed["value"]]
+        return []
+
+    def _end(self) -> Optional[float]:
+        if self.start is None:
+            return None
+        if self.mode == "tumbling":
+            return self.start + self.size_sec
+        return self.last
+
+    def _add_tumbling(
+        self,
+        ts: float,
+        x: float,
+        closed: List[Dict[str, Any]],
+    ) -> None:
+        start = ts - ts % self.size_sec
+        if self.start is not None and start > self.start:
+            closed.append(self.current())
+            self.stats = RunningStats()
+        if self.start is None or start > self.start:
+            self.start = start
+        self.last = ts
+        self.stats.add(x)
+
+    def _add_session(
+        self,
+        ts: float,
+        x: float,
+        closed: List[Dict[str, Any]],
+    ) -> None:
+        gap = self.gap_sec or 0.0
+        if self.last is not None and ts - self.last > gap:
+            closed.append(self.current())
+            self.stats = RunningStats()
+            self.start = None
+        if self.start is None:
+            self.start = ts
+        self.last = ts
+        self.stats.add(x)
+
+    def _add_sliding(
+        self,
+        ts: float,
+        x: float,
+        closed: List[Dict[str, Any]],
+    ) -> None:
+        self.window.append((ts, x))
+        self.stats.add(x)
+        while self.min_q and self.min_q[-1][1] >= x:
+            self.min_q.pop()
+        self.min_q.append((ts, x))
+        while self.max_q and self.max_q[-1][1] <= x:
+            self.max_q.pop()
+        self.max_q.append((ts, x))
+
+        cutoff = ts - self.size_sec
+        while self.window[0][0] <= cutoff:
+            self.stats.remove(self.window.popleft()[1])
+        while self.min_q[0][0] <= cutoff:
+            self.min_q.popleft()
+        while self.max_q[0][0] <= cutoff:
+            self.max_q.popleft()
+        self.start = self.window[0][0]
+        self.last = ts
+
+
+def _tag_stage(error: BaseException, stage: str) -> None:
+    """Note on error which stage raised it, unless an inner run did."""
+    if getattr(error, "pipeline_stage", None) is None:
+        try:
+            error.pipeline_stage = stage  # type: ignore[attr-defined]
+        except AttributeError:
+            pass
+
+
+def _fast_path(stage: Any, name: str) -> Optional[Callable[..., Any]]:
+    """Return stage.<name> unless it would bypass stage.process.
+
+    compile(), process_batch() and process_columns() re-implement
+    process(); they are only used when defined on the class that
+    defines process() or a subclass of it, so a subclass overriding
+    just process() is not silently skipped.
+    """
+    method = getattr(stage, name, None)
+    if method is None:
+        return None
+    mro = type(stage).__mro__
+    owner = next((cls for cls in mro if "process" in vars(cls)), None)
+    impl = next((cls for cls in mro if name in vars(cls)), None)
+    if owner is None or impl is None or not issubclass(impl, owner):
+        return None
+    return method
+
+
+def _reject_awaitable(stage: ProcessingStage, result: Any) -> None:
+    """Fail clearly when a coroutine stage runs on the sync path."""
+    if inspect.isawaitable(result):
+        close = getattr(result, "close", None)
+        if close is not None:
+            close()
+        raise TypeError(
+            f"{type(stage).__name__}.process is async; "
+            "run it through AsyncProcessingPipeline"
+        )
+
+
+def _context_step(stage: ProcessingStage) -> Step:
+    """Wrap a context-aware stage without a compiled form."""
+    process = stage.process
+
+    def step(context: PipelineContext) -> PipelineContext:
+        context = process(context)
+        _reject_awaitable(stage, context)
+        if not isinstance(context, PipelineContext):
+            raise ValueError("Pipeline stages must return a context")
+        return context
+    return step
+
+
+def _dict_step(stage: ProcessingStage) -> Step:
+    """Compatibility shim: run a dict-based stage on a PipelineContext."""
+    process = stage.process
+
+    def step(context: PipelineContext) -> PipelineContext:
+        data = process(context.to_dict())
+        _reject_awaitable(stage, data)
+        if not isinstance(data, dict):
+            raise ValueError("Pipeline stages must return dict context")
+        context.load(data)
+        return context
+    return step
+
+
+class ProcessingPipeline(ABC):
+    """Abstract pipeline base class with configurable stages."""
+    KIND = ""
+    RAW_LABEL: Optional[str] = None
+
+    def __init__(self, pipeline_id: str, pipeline_type: str) -> None:
+        self.pipeline_id = pipeline_id
+        self.pipeline_type = pipeline_type
+        self.context_pool: Optional[ContextPool] = None
+        self.result_cache: Optional[ResultCache] = None
+        self._plans: Dict[str, List[Step]] = {}
+        self.live_fields: Optional[FrozenSet[str]] = None
+        self.pruned: List[Dict[str, Any]] = []
+        self.stages: List[ProcessingStage] = [
+            InputStage(),
+            TransformStage(),
+            OutputStage(),
+        ]
+        self.stats = PipelineStats(pipeline_id, pipeline_type)
+
+    @property
+    def stages(self) -> List[ProcessingStage]:
+        return self._stages
+
+    @stages.setter
+    def stages(self, stages: List[ProcessingStage]) -> None:
+        self._stages = stages
+        self.invalidate_plan()
+
+    def invalidate_plan(self) -> None:
+        """Drop compiled plans, stage names and cached outputs.
+
+        Runs also do this by themselves when self.stages was edited in
+        place since the plans were built.
+        """
+        self._plans = {}
+        self._native: Dict[str, bool] = {}
+        if self.result_cache is not None:
+            self.result_cache.clear()
+        self._planned = list(self._stages)
+        names = [type(stage).__name__ for stage in self._stages]
+        self.stage_names = [
+            name if names.count(name) == 1 else f"{name}#{i}"
+            for i, name in enumerate(names)
+        ]
+        if self.live_fields is not None:
+            self.pruned = self._prune(self.live_fields)
+
+    def prune(
+        self,
+        keep: Optional[Iterable[str]] = ("output",),
+    ) -> List[Dict[str, Any]]:
+        """Skip optional stage writes that nothing downstream reads.
+
+        keep names the context fields the caller uses after the last
+        stage; the default suits process(), which only returns the
+        output. Pruning is redone whenever the stages change; pass None
+        to turn it off again. skip_writes lives on the stage objects,
+        so a stage shared by two pipelines follows the last prune().
+        Returns the report also kept in self.pruned.
+        """
+        if keep is None:
+            self.live_fields = None
+            self.pruned = []
+            for stage in self._stages:
+                if getattr(stage, "optional_writes", ()):
+                    stage.skip_writes = frozenset()
+        else:
+            self.live_fields = frozenset(keep)
+        self.invalidate_plan()
+        return self.pruned
+
+    def _prune(self, keep: FrozenSet[str]) -> List[Dict[str, Any]]:
+        """Backward liveness pass over the declared stage fields."""
+        live: Optional[Set[str]] = set(keep)
+        report = []
+        for name, stage in reversed(list(zip(self.stage_names,
+                                             self._stages))):
+            optional = getattr(stage, "optional_writes", ())
+            skipped = frozenset(
+                f for f in optional if live is not None and f not in live
+            )
+            if optional:
+                stage.skip_writes = skipped
+            report.append({
+                "stage": name,
+                "skipped": sorted(skipped),
+                "read_downstream": None if live is None else sorted(live),
+            })
+            reads = getattr(stage, "reads", None)
+            if reads is None:
+                # Undeclared stage: it may read anything upstream wrote.
+                live = None
+            elif live is not None:
+                live.difference_update(getattr(stage, "writes", ()))
+                live.update(reads)
+        report.reverse()
+        return report
+
+    def pruning_report(self) -> str:
+        """Human-readable form of self.pruned, for debugging."""
+        if self.live_fields is None:
+            return f"{self.pipeline_id}: pruning off"
+        lines = [
+            f"{self.pipeline_id}: keep {', '.join(sorted(self.live_fields))}"
+        ]
+        for entry in self.pruned:
+            downstream = entry["read_downstream"]
+            reads = "any" if downstream is None else ", ".join(downstream)
+            skipped = ", ".join(entry["skipped"]) or "-"
+            lines.append(
+                f"  {entry['stage']}: skipped {skipped} "
+                f"(read downstream: {reads})"
+            )
+        return "\n".join(lines)
+
+    def set_trace(self, sink: TraceSink) -> None:
+        """Route trace events of every tracing stage to sink."""
+        for stage in self._stages:
+            if hasattr(stage, "trace"):
+                stage.trace = sink
+
+    def get_state(self) -> Dict[str, Any]:
+        """Stats plus the state of stages with get_state(), for checkpoints."""
+        stages = {}
+        for name, stage in zip(self.stage_names, self._stages):
+            get_state = getattr(stage, "get_state", None)
+            if get_state is not None:
+                stages[name] = get_state()
+        return {"stats": self.stats.to_dict(), "stages": stages}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """Restore a get_state() snapshot taken with the same stages."""
+        self.stats.load(state["stats"])
+        for name, stage in zip(self.stage_names, self._stages):
+            if name in state["stages"]:
+                stage.set_state(state["stages"][name])
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Compiled steps are closures and cannot be pickled; workers
+        # simply recompile them on first use.
+        state = self.__dict__.copy()
+        state["_plans"] = {}
+        return state
+
+    def compile_plan(self, kind: Any) -> List[Step]:
+        """Specialise every stage for one kind, caching known kinds.
+
+        Stages without compile(), or whose process() is overridden
+        below it, run through process(): directly if they set
+        accepts_context, else via a dict round-trip.
+        """
+        plan: List[Step] = []
+        compiled = False
+        native = True
+        for stage in self._stages:
+            compile_kind = _fast_path(stage, "compile")
+            step = None
+            if compile_kind is not None and isinstance(kind, str):
+                step = compile_kind(kind)
+            if step is not None:
+                compiled = True
+            elif getattr(stage, "accepts_context", False):
+                step = _context_step(stage)
+            else:
+                step = _dict_step(stage)
+                native = False
+            plan.append(step)
+        if compiled:
+            self._plans[kind] = plan
+            self._native[kind] = native
+        return plan
+
+    def _native_plan(self, kind: Any) -> bool:
+        """True if kind's plan runs without the dict shim."""
+        if not isinstance(kind, str):
+            return False
+        if kind not in self._plans:
+            self.compile_plan(kind)
+        return self._native.get(kind, False)
+
+    def run_context(self, context: PipelineContext) -> PipelineContext:
+        """Execute the compiled plan for the context's kind."""
+        if self._planned != self._stages:
+            self.invalidate_plan()
+        kind = context.kind
+        plan = self._plans.get(kind) if isinstance(kind, str) else None
+        if plan is None:
+            plan = self.compile_plan(kind)
+
+        step: Optional[Step] = None
+        try:
+            if self.stats.sample():
+                clock = time.perf_counter
+                begin = clock()
+                for name, step in zip(self.stage_names, plan):
+                    start = clock()
+                    context = step(context)
+                    self.stats.record_stage(name, clock() - start)
+                self.stats.run_latency.record(clock() - begin)
+                return context
+
+            for step in plan:
+                context = step(context)
+            return context
+        except Exception as e:
+            # The loop variable still holds the step that raised.
+            if step is not None:
+                _tag_stage(e, self.stage_names[plan.index(step)])
+            raise
+
+    def run_stages(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute stages in order and return the updated context.
+
+        A dict context whose plan is fully compiled is converted to a
+        PipelineContext at the edges and updated in place. If any stage
+        works on plain dicts, every stage gets the dict the previous
+        one returned instead, so stages that delete keys or return a
+        new dict behave exactly as without compiled plans.
+        """
+        if isinstance(context, PipelineContext):
+            return self.run_context(context)
+        if self._planned != self._stages:
+            self.invalidate_plan()
+        is_dict = isinstance(context, dict)
+        if is_dict and self._native_plan(context.get("kind")):
+            result = self.run_context(PipelineContext.from_dict(context))
+            context.clear()
+            context.update(result.to_dict())
+            return context
+
+        data: Any = context
+        for name, stage in zip(self.stage_names, self.stages):
+            try:
+                data = stage.process(data)
+            except Exception as e:
+                _tag_stage(e, name)
+                raise
+            if is_dict and not isinstance(data, dict):
+                raise ValueError("Pipeline stages must return dict context")
+        return data
+
+    def enable_cache(
+        self,
+        max_size: int = 1024,
+        ttl: Optional[float] = None,
+    ) -> ResultCache:
+        """Opt in to caching outputs of identical raw inputs."""
+        self.result_cache = ResultCache(max_size, ttl)
+        return self.result_cache
+
+    def run_record(self, data: Any) -> str:
+        """Parse one raw record into a context, run it, return the output."""
+        if self._planned != self._stages:
+            # Before the lookup: outputs of the old stages are stale.
+            self.invalidate_plan()
+        cache = self.result_cache
+        if cache is None:
+            return self._run_uncached(data)
+
+        key = cache.key(data)
+        if key is None:
+            return self._run_uncached(data)
+        output = cache.get(key, self.stats)
+        if output is not None:
+            return output
+        output = self._run_uncached(data)
+        cache.put(key, output)
+        return output
+
+    def _run_uncached(self, data: Any) -> str:
+        parsed = self.parse(data)
+        raw = data if self.RAW_LABEL is None else self.RAW_LABEL
+        pool = self.context_pool
+        if pool is None:
+            return str(self.run_context(
+                PipelineContext(self.KIND, raw, parsed)
+            ).output)
+
+        context = self.run_context(pool.acquire(self.KIND, raw, parsed))
+        output = str(context.output)
+        pool.release(context)
+        return output
+
+    def run_stages_batch(
+        self,
+        contexts: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """Execute each stage once over the whole list of contexts.
+
+        A stage's process_batch() is skipped in favour of per-record
+        process() calls when a subclass overrides only process().
+        """
+        if self._planned != self._stages:
+            self.invalidate_plan()
+        batch: List[Any] = contexts
+        timed = bool(contexts) and self.stats.sample()
+        begin = time.perf_counter()
+        for name, stage in zip(self.stage_names, self.stages):
+            start = time.perf_counter()
+            process_batch = _fast_path(stage, "process_batch")
+            try:
+                if process_batch is None:
+                    batch = [stage.process(data) for data in batch]
+                else:
+                    batch = process_batch(batch)
+            except Exception as e:
+                _tag_stage(e, name)
+                raise
+            if not all(isinstance(data, dict) for data in batch):
+                raise ValueError("Pipeline stages must return dict context")
+            if timed:
+                dt = time.perf_counter() - start
+                self.stats.record_stage(name, dt / len(contexts))
+        if timed:
+            dt = time.perf_counter() - begin
+            self.stats.run_latency.record(dt / len(contexts))
+        return batch
+
+    def process_context(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Run stages with timing/error stats, but without adapter parsing."""
+        start = time.perf_counter()
+        ok = True
+        try:
+            return self.run_stages(context)
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.stats.add_run(time.perf_counter() - start, ok)
+
+    def process_context_batch(
+        self,
+        contexts: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """Run stages over many contexts, recording one stats entry."""
+        start = time.perf_counter()
+        ok = True
+        try:
+            return self.run_stages_batch(contexts)
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.stats.add_run(
+                time.perf_counter() - start, ok, len(contexts), batch=True
+            )
+
+    def process_batch(self, records: List[Any]) -> List[str]:
+        """Parse and process many raw records in one pass over the stages."""
+        start = time.perf_counter()
+        ok = True
+        try:
+            if self.result_cache is not None:
+                return self._process_batch_cached(records, self.result_cache)
+            contexts = [self.build_context(data) for data in records]
+            contexts = self.run_stages_batch(contexts)
+            return [str(context["output"]) for context in contexts]
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.stats.add_run(
+                time.perf_counter() - start, ok, len(records), batch=True
+            )
+
+    def _process_batch_cached(
+        self,
+        records: List[Any],
+        cache: ResultCache,
+    ) -> List[str]:
+        """Batch path that only runs the stages for cache misses."""
+        if self._planned != self._stages:
+            self.invalidate_plan()
+        outputs = [""] * len(records)
+        miss_at: List[int] = []
+        miss_keys: List[Optional[bytes]] = []
+        for i, data in enumerate(records):
+            key = cache.key(data)
+            if key is None:
+                output = None
+                with cache.lock:
+                    self.stats.cache_misses += 1
+            else:
+                output = cache.get(key, self.stats)
+            if output is None:
+                miss_at.append(i)
+                miss_keys.append(key)
+            else:
+                outputs[i] = output
+
+        contexts = self.run_stages_batch(
+            [self.build_context(records[i]) for i in miss_at]
+        )
+        for i, key, context in zip(miss_at, miss_keys, contexts):
+            output = str(context["output"])
+            outputs[i] = output
+            if key is not None:
+                cache.put(key, output)
+        return outputs
+
+    def supports_columns(self, kind: Any) -> bool:
+        """True if every stage has process_columns() for this kind.
+
+        As with process_batch(), an inherited process_columns() does not
+        count when a subclass overrides process().
+        """
+        return all(
+            kind in getattr(stage, "column_kinds", ())
+            and _fast_path(stage, "process_columns") is not None
+            for stage in self._stages
+        )
+
+    def rows_to_columns(
+        self,
+        contexts: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Turn parsed row contexts of one kind into a column batch.
+
+        Every key of the parsed dicts becomes a list column; stages
+        pack the columns they compute on into arrays. Keys missing from
+        a row hold the _MISSING sentinel.
+        """
+        kind = contexts[0].get("kind") if contexts else self.KIND
+        names: Dict[str, None] = {}
+        rows = []
+        for context in contexts:
+            if context.get("kind") != kind:
+                raise ValueError("A column batch must hold a single kind")
+            parsed = context.get("parsed")
+            if not isinstance(parsed, dict):
+                raise ValueError("Column batches need dict parsed records")
+            if not names.keys() >= parsed.keys():
+                names.update(dict.fromkeys(parsed))
+            rows.append(parsed)
+        return {
+            "kind": kind,
+            "size": len(contexts),
+            "raw": [context.get("raw") for context in contexts],
+            "parsed": list(names),
+            "columns": {
+                name: [row.get(name, _MISSING) for row in rows]
+                for name in names
+            },
+        }
+
+    def columns_to_rows(self, batch: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Turn a column batch back into row contexts.
+
+        "parsed" is rebuilt from the input columns as they are now, so
+        it reflects any column a stage rewrote in place.
+        """
+        columns = batch["columns"]
+        transformed = batch.get("transformed", ())
+        output = batch.get("output")
+        rows = []
+        for i in range(batch["size"]):
+            context: Dict[str, Any] = {
+                "kind": batch["kind"],
+                "raw": batch["raw"][i],
+                "parsed": {
+                    name: columns[name][i] for name in batch["parsed"]
+                    if columns[name][i] is not _MISSING
+                },
+            }
+            if "validated" in batch:
+                context["validated"] = batch["validated"]
+            if "metadata" in batch:
+                context["metadata"] = dict(batch["metadata"])
+            if transformed:
+                context["transformed"] = {
+                    name: columns[name][i] for name in transformed
+                }
+            if output is not None:
+                context["output"] = output[i]
+            rows.append(context)
+        return rows
+
+    def run_columns(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """Run every stage's process_columns() over one column batch."""
+        if self._planned != self._stages:
+            self.invalidate_plan()
+        kind = batch["kind"]
+        if not self.supports_columns(kind):
+            raise ValueError(f"Not every stage handles '{kind}' columns")
+        size = batch["size"]
+        timed = size > 0 and self.stats.sample()
+        begin = time.perf_counter()
+        for name, stage in zip(self.stage_names, self._stages):
+            start = time.perf_counter()
+            try:
+                batch = stage.process_columns(batch)
+            except Exception as e:
+                _tag_stage(e, name)
+                raise
+            if timed:
+                dt = time.perf_counter() - start
+                self.stats.record_stage(name, dt / size)
+        if timed:
+            dt = time.perf_counter() - begin
+            self.stats.run_latency.record(dt / size)
+        return batch
+
+    def process_columns(self, records: List[Any]) -> List[str]:
+        """Like process_batch(), but run the stages on column arrays.
+
+        Records are parsed, turned into one column batch and come out
+        as output strings: rows exist only at these two edges. Falls
+        back to process_batch() if a stage lacks columns for the kind.
+        """
+        if not self.supports_columns(self.KIND):
+            return self.process_batch(records)
+        start = time.perf_counter()
+        ok = True
+        try:
+            contexts = [self.build_context(data) for data in records]
+            batch = self.run_columns(self.rows_to_columns(contexts))
+            return list(batch.get("output", ()))
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.stats.add_run(
+                time.perf_counter() - start, ok, len(records), batch=True
+            )
+
+    def build_context(self, data: Any) -> Dict[str, Any]:
+        return {
+            "kind": self.KIND,
+            "raw": data if self.RAW_LABEL is None else self.RAW_LABEL,
+            "parsed": self.parse(data),
+        }
+
+    @abstractmethod
+    def parse(self, data: Any) -> Any:
+        ...
+
+    @abstractmethod
+    def process(self, data: Any) -> Union[str, Any]:
+        ...
+
+
+class JSONCodec:
+    """Stdlib JSON decoding; base class of the accelerated codecs.
+
+    decoder(fields) returns a decode function that keeps only the given
+    keys of a top-level object, so records carry just what the stages
+    read; only msgspec skips the other keys while decoding. Accelerated
+    codecs fall back to the stdlib on input they reject (such as NaN),
+    so every codec accepts the same JSON; orjson does read integers
+    wider than 64 bits as floats.
+    """
+    name = "json"
+
+    def loads(self, data: Any) -> Any:
+        if isinstance(data, memoryview):
+            # json.loads takes str, bytes or bytearray only.
+            data = str(data, "utf-8")
+        return json.loads(data)
+
+    def decoder(
+        self,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Callable[[Any], Any]:
+        if fields is None:
+            return self.loads
+        keep = tuple(fields)
+        loads = self.loads
+
+        def decode(data: Any) -> Any:
+            obj = loads(data)
+            if isinstance(obj, dict):
+                return {key: obj[key] for key in keep if key in obj}
+            return obj
+        return decode
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return get_json_codec, (self.name,)
+
+
+class OrjsonCodec(JSONCodec):
+    name = "orjson"
+
+    def loads(self, data: Any) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return super().loads(data)
+
+
+class UjsonCodec(JSONCodec):
+    name = "ujson"
+
+    def loads(self, data: Any) -> Any:
+        if isinstance(data, memoryview):
+            data = str(data, "utf-8")
+        try:
+            return ujson.loads(data)
+        except ValueError:
+            return json.loads(data)
+
+
+class MsgspecCodec(JSONCodec):
+    """msgspec decoding; with fields, unknown keys are skipped unparsed."""
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        self.json_decoder = msgspec.json.Decoder()
+
+    def loads(self, data: Any) -> Any:
+        try:
+            return self.json_decoder.decode(data)
+        except msgspec.DecodeError:
+            return super().loads(data)
+
+    def decoder(
+        self,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Callable[[Any], Any]:
+        if fields is None:
+            return self.loads
+        keep = tuple(dict.fromkeys(fields))
+        # JSON keys need not be identifiers: use positional attribute
+        # names and map them back to the keys with rename.
+        attrs = [f"f{i}" for i in range(len(keep))]
+        record = msgspec.defstruct(
+            "JSONRecord",
+            [(attr, Any, msgspec.UNSET) for attr in attrs],
+            rename=dict(zip(attrs, keep)),
+        )
+        typed = msgspec.json.Decoder(record)
+        fallback = super().decoder(keep)
+        unset = msgspec.UNSET
+        pairs = tuple(zip(keep, attrs))
+
+        def decode(data: Any) -> Any:
+            try:
+                obj = typed.decode(data)
+            except msgspec.DecodeError:
+                # Not an object, or not msgspec-compatible JSON.
+                return fallback(data)
+            out = {}
+            for key, attr in pairs:
+                value = getattr(obj, attr)
+                if value is not unset:
+                    out[key] = value
+            return out
+        return decode
+
+
+# Preferred first; a codec is used only if its module imported.
+JSON_CODECS: Dict[str, Tuple[Any, Callable[[], JSONCodec]]] = {
+    "msgspec": (msgspec, MsgspecCodec),
+    "orjson": (orjson, OrjsonCodec),
+    "ujson": (ujson, UjsonCodec),
+    "json": (json, JSONCodec),
+}
+
+
+def available_json_codecs() -> List[str]:
+    return [name for name, (module, _) in JSON_CODECS.items() if module]
+
+
+def get_json_codec(name: Optional[str] = None) -> JSONCodec:
+    """Return the named codec, or the fastest one installed."""
+    if name is None:
+        name = available_json_codecs()[0]
+    if name not in JSON_CODECS:
+        raise ValueError(f"Unknown JSON codec: {name}")
+    module, codec = JSON_CODECS[name]
+    if module is None:
+        raise ValueError(f"JSON codec '{name}' is not installed")
+    return codec()
+
+
+class JSONAdapter(ProcessingPipeline):
+    """Adapter: parse JSON string to context, then run shared stages.
+
+    bytes, bytearray and memoryview records are handed to the codec
+    as they are; msgspec and orjson decode them without a str copy.
+    codec is a JSONCodec or codec name (default: fastest installed).
+    With fields, only those keys of each record are decoded, e.g.
+    JSON_RECORD_FIELDS for the default stages.
+    """
+    KIND = "json"
+
+    def __init__(
+        self,
+        pipeline_id: str,
+        codec: Optional[Union[str, JSONCodec]] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> None:
+        super().__init__(pipeline_id, "JSON")
+        if codec is None or isinstance(codec, str):
+            codec = get_json_codec(codec)
+        self.codec = codec
+        self.fields = tuple(fields) if fields is not None else None
+        self.decode = codec.decoder(self.fields)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = super().__getstate__()
+        del state["decode"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.decode = self.codec.decoder(self.fields)
+
+    def parse(self, data: Any) -> Any:
+        if not isinstance(data, (str,) + BYTES_LIKE):
+            raise ValueError("JSONAdapter expects a JSON string or bytes")
+
+        return self.decode(data)
+
+    def process(self, data: Any) -> str:
+        start = time.perf_counter()
+        ok = True
+        try:
+            return self.run_record(data)
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.stats.add_run(time.perf_counter() - start, ok)
+
+    def process_stream(
+        self,
+        fileobj: Any,
+        on_error: Optional[Callable[[int, Any, Exception], None]] = None,
+    ) -> Iterator[str]:
+        """Lazily process newline-delimited JSON from a file, pipe or mmap.
+
+        Lines are read one at a time with readline(), so memory stays
+        constant. Bytes lines from binary files go to the codec as they
+        are, so invalid UTF-8 fails that line. A line that fails is
+        counted in stats, reported to on_error(line_no, line, error) if
+        given, and skipped.
+        """
+        line_no = 0
+        while True:
+            line = fileobj.readline()
+            if not line:
+                return
+            line_no += 1
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                output = self.process(line)
+            except Exception as e:
+                if on_error is not None:
+                    on_error(line_no, line, e)
+                continue
+            yield output
+
+
+def _to_float(value: str) -> float:
+    return float(value) if value else float("nan")
+
+
+# Column types widen left to right when a later chunk does not fit.
+_CSV_TYPES: List[Tuple[type, Optional[str], Callable[[str], Any]]] = [
+    (int, "q", int),
+    (float, "d", _to_float),
+    (str, None, str),
+]
+
+
+class CSVColumnReader:
+    """Stream a CSV file as typed, array-backed column chunks.
+
+    The first row is the header. Rows are read chunk_size at a time with
+    the csv module and transposed into one column per field: int and
+    float columns become array.array, anything else a list of str.
+    Column types come from `types` or are inferred from the data; an
+    inferred type is widened (int -> float -> str) if a later chunk
+    does not fit. Rows with the wrong number of fields are skipped.
+    Binary files are decoded as UTF-8 while they are read.
+    """
+    def __init__(
+        self,
+        fileobj: Any,
+        chunk_size: int = 10000,
+        types: Optional[Dict[str, type]] = None,
+        delimiter: str = ",",
+    ) -> None:
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be >= 1")
+        if isinstance(fileobj, (io.RawIOBase, io.BufferedIOBase)):
+            fileobj = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+        self.reader = csv.reader(fileobj, delimiter=delimiter)
+        self.chunk_size = chunk_size
+        self.fields = [x.strip() for x in next(self.reader, [])]
+        if not self.fields:
+            raise ValueError("CSV input has no header row")
+
+        given = types or {}
+        unknown = [t for t in given.values() if t not in (int, float, str)]
+        if unknown:
+            raise ValueError(f"Unsupported CSV column types: {unknown}")
+        self.fixed = [name in given for name in self.fields]
+        self.levels = [
+            [t for t, _, _ in _CSV_TYPES].index(given.get(name, int))
+            for name in self.fields
+        ]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        width = len(self.fields)
+        while True:
+            rows = list(islice(self.reader, self.chunk_size))
+            if not rows:
+                return
+            good = [row for row in rows if len(row) == width]
+            columns = zip(*good) if good else [() for _ in self.fields]
+            yield {
+                "fields": self.fields,
+                "columns": {
+                    name: self._convert(i, values)
+                    for i, (name, values) in enumerate(
+                        zip(self.fields, columns)
+                    )
+                },
+                "rows": len(good),
+                "skipped": len(rows) - len(good),
+            }
+
+    def _convert(self, i: int, values: Tuple[str, ...]) -> Any:
+        while True:
+            _, typecode, convert = _CSV_TYPES[self.levels[i]]
+            try:
+                converted = map(convert, values)
+                if typecode is None:
+                    return list(converted)
+                return array(typecode, converted)
+            except (ValueError, OverflowError):
+                if self.fixed[i]:
+                    raise ValueError(
+                        f"CSV column '{self.fields[i]}' does not match "
+                        f"its declared type"
+                    )
+                self.levels[i] += 1
+
+
+class CSVAdapter(ProcessingPipeline):
+    """Adapter: parse CSV header string into fields, then run shared stages.
+
+    Bytes-like records are decoded as UTF-8 straight from their buffer,
+    and process_file() also takes files opened in binary mode.
+    """
+    KIND = "csv"
+
+    def __init__(self, pipeline_id: str) -> None:
+        super().__init__(pipeline_id, "CSV")
+
+    def parse(self, data: Any) -> Any:
+        if isinstance(data, BYTES_LIKE):
+            data = str(data, "utf-8")
+        elif not isinstance(data, str):
+            raise ValueError("CSVAdapter expects a CSV string or bytes")
+
+        return {"fields": [x.strip() for x in data.split(",") if x.strip()]}
+
+    def process(self, data: Any) -> str:
+        start = time.perf_counter()
+        ok = True
+        try:
+            return self.run_record(data)
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.stats.add_run(time.perf_counter() - start, ok)
+
+    def read_chunks(
+        self,
+        fileobj: Any,
+        chunk_size: int = 10000,
+        types: Optional[Dict[str, type]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield one csv context with columnar "parsed" data per chunk."""
+        for parsed in CSVColumnReader(fileobj, chunk_size, types):
+            yield {"kind": "csv", "raw": "CSV row chunk", "parsed": parsed}
+
+    def process_file(
+        self,
+        fileobj: Any,
+        chunk_size: int = 10000,
+        types: Optional[Dict[str, type]] = None,
+    ) -> Iterator[str]:
+        """Process every row of a CSV file, yielding one output per chunk."""
+        for parsed in CSVColumnReader(fileobj, chunk_size, types):
+            start = time.perf_counter()
+            ok = True
+            try:
+                context = PipelineContext("csv", "CSV row chunk", parsed)
+                output = str(self.run_context(context).output)
+            except Exception:
+                ok = False
+                raise
+            finally:
+                self.stats.add_run(
+                    time.perf_counter() - start, ok, parsed["rows"]
+                )
+            yield output
+
+
+class StreamAdapter(ProcessingPipeline):
+    """Adapter: wrap numeric readings as a stream context, then run stages.
+
+    Readings may be a list or, without copying, an array.array,
+    memoryview or NumPy array. bytes, bytearray and byte-formatted
+    memoryviews are raw packed readings: they are cast to wire_format
+    (a struct code, native byte order) in place.
+    """
+    KIND = "stream"
+    RAW_LABEL = "Real-time sensor stream"
+
+    def __init__(self, pipeline_id: str, wire_format: str = "d") -> None:
+        super().__init__(pipeline_id, "STREAM")
+        self.wire_format = wire_format
+
+    def parse(self, data: Any) -> Any:
+        if isinstance(data, str):
+            raise ValueError(
+                "StreamAdapter expects numeric readings list, not a string"
+            )
+        if isinstance(data, BYTES_LIKE):
+            view = memoryview(data)
+            if view.format in ("B", "b", "c"):
+                try:
+                    data = view.cast(self.wire_format)
+                except (TypeError, ValueError) as e:
+                    raise ValueError(
+                        f"Cannot read {view.nbytes} bytes as "
+                        f"'{self.wire_format}' readings: {e}"
+                    ) from e
+        elif not isinstance(data, list) and not is_numeric_buffer(data):
+            raise ValueError(
+                "StreamAdapter expects a list or numeric buffer of readings"
+            )
+
+        return {"readings": data}
+
+    def process(self, data: Any) -> str:
+        start = time.perf_counter()
+        ok = True
+        try:
+            return self.run_record(data)
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.stats.add_run(time.perf_counter() - start, ok)
+
+    def process_log(
+        self,
+        reader: "RecordLogReader",
+        window: int = 256,
+        field: Optional[str] = None,
+    ) -> Iterator[str]:
+        """Process a record log as windows of readings, one output each.
+
+        Windows are zero-copy views into the log's mapping.
+        """
+        for readings in reader.windows(window, field):
+            yield self.process(readings)
+
+
+_LOG_MAGIC = b"NXRL"
+_LOG_VERSION = 1
+# magic, version, pad, length of the JSON schema that follows.
+_LOG_HEADER = struct.Struct("<4sBxH")
+_NUMPY_CODES = {
+    "?": "b1", "b": "i1", "B": "u1", "h": "i2", "H": "u2", "i": "i4",
+    "I": "u4", "q": "i8", "Q": "u8", "f": "f4", "d": "f8",
+}
+
+
+def _log_schema(fields: Sequence[str], fmt: str) -> Tuple[str, bytes]:
+    """Normalise a record format and encode the file's schema header."""
+    if fmt[:1] in ("@", "="):
+        raise ValueError("Record formats must not use native alignment")
+    if fmt[:1] not in ("<", ">", "!"):
+        fmt = "<" + fmt
+    record = struct.Struct(fmt)
+    if len(record.unpack(bytes(record.size))) != len(fields):
+        raise ValueError("Record format and fields differ in length")
+    meta = json.dumps({"format": fmt, "fields": list(fields)}).encode()
+    # Pad so records start 8-byte aligned.
+    meta += b" " * (-(_LOG_HEADER.size + len(meta)) % 8)
+    return fmt, _LOG_HEADER.pack(_LOG_MAGIC, _LOG_VERSION, len(meta)) + meta
+
+
+def _read_log_header(f: Any) -> Tuple[str, List[str], int]:
+    head = f.read(_LOG_HEADER.size)
+    if len(head) < _LOG_HEADER.size:
+        raise ValueError("Not a record log: file too short")
+    magic, version, meta_len = _LOG_HEADER.unpack(head)
+    if magic != _LOG_MAGIC or version != _LOG_VERSION:
+        raise ValueError("Not a record log, or an unsupported version")
+    meta = json.loads(f.read(meta_len))
+    return meta["format"], meta["fields"], _LOG_HEADER.size + meta_len
+
+
+def _struct_codes(fmt: str) -> List[str]:
+    """Split a struct format into codes, e.g. '<2d8s' -> [d, d, 8s]."""
+    codes = []
+    count = ""
+    for ch in fmt.lstrip("<>!=@"):
+        if ch.isdigit():
+            count += ch
+        elif ch == "s":
+            codes.append(count + "s")
+            count = ""
+        else:
+            codes.extend([ch] * int(count or 1))
+            count = ""
+    return codes
+
+
+class RecordLogWriter:
+    """Append fixed-schema binary records to a record log file.
+
+    Each record is one struct (fmt, standard sizes, little-endian by
+    default) of the given fields; 's' fields take str or bytes. Data
+    is fsynced every fsync_every records or fsync_interval seconds,
+    whichever comes first, and on close(). Reopening an existing log
+    checks its schema and drops a torn trailing record.
+    """
+    def __init__(
+        self,
+        path: str,
+        fields: Sequence[str],
+        fmt: str,
+        fsync_every: int = 4096,
+        fsync_interval: float = 1.0,
+    ) -> None:
+        self.fmt, header = _log_schema(fields, fmt)
+        self.fields = list(fields)
+        self.record = struct.Struct(self.fmt)
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "r+b") as f:
+                fmt_on_disk, fields_on_disk, offset = _read_log_header(f)
+                if (fmt_on_disk, fields_on_disk) != (self.fmt, self.fields):
+                    raise ValueError(
+                        f"Record log {path} has schema {fields_on_disk} "
+                        f"'{fmt_on_disk}'"
+                    )
+                size = f.seek(0, os.SEEK_END)
+                f.truncate(size - (size - offset) % self.record.size)
+            self.file = open(path, "ab")
+        else:
+            self.file = open(path, "wb")
+            self.file.write(header)
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def write(self, record: Sequence[Any]) -> None:
+        self.write_many((record,))
+
+    def write_many(self, records: Iterable[Sequence[Any]]) -> None:
+        pack = self.record.pack
+        data = b"".join(
+            pack(*[v.encode() if isinstance(v, str) else v for v in r])
+            for r in records
+        )
+        with self.lock:
+            self.file.write(data)
+            self.unsynced += len(data) // self.record.size
+            if (
+                self.unsynced >= self.fsync_every
+                or time.monotonic() - self.synced_at >= self.fsync_interval
+            ):
+                self._sync()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._sync()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file.closed:
+                return
+            self._sync()
+            self.file.close()
+
+    def _sync(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def __enter__(self) -> "RecordLogWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class RecordLogReader:
+    """Read a record log through mmap without copying record data.
+
+    records() slices raw bytes. column() is a memoryview (single-field
+    numeric logs in native byte order) or a strided NumPy view, and
+    only falls back to unpacking into a list when neither applies;
+    's' fields come back as NUL-padded bytes. Views pin the mapping:
+    release them before close(). refresh() maps records appended since
+    opening; a torn trailing record is ignored.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self.fmt, self.fields, self.offset = _read_log_header(f)
+        self.record = struct.Struct(self.fmt)
+        self.dtype = None
+        codes = _struct_codes(self.fmt)
+        if np is not None and all(
+            code in _NUMPY_CODES or code.endswith("s") for code in codes
+        ):
+            order = ">" if self.fmt[0] in (">", "!") else "<"
+            self.dtype = np.dtype([
+                (name, f"S{code[:-1] or 1}" if code.endswith("s")
+                 else order + _NUMPY_CODES[code])
+                for name, code in zip(self.fields, codes)
+            ])
+        self.file = open(path, "rb")
+        self.mm: Optional[mmap.mmap] = None
+        self.count = 0
+        self.refresh()
+
+    def refresh(self) -> int:
+        """Map the file again if it grew; return the record count."""
+        size = os.fstat(self.file.fileno()).st_size
+        if self.mm is not None and size == len(self.mm):
+            return self.count
+        if self.mm is not None:
+            self.mm.close()
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = (size - self.offset) // self.record.size
+        return self.count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> Tuple[Any, ...]:
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("record index out of range")
+        return self.record.unpack_from(
+            self.mm, self.offset + i * self.record.size
+        )
+
+    def __iter__(self) -> Iterator[Tuple[Any, ...]]:
+        return self.record.iter_unpack(self.records())
+
+    def records(self, start: int = 0, stop: Optional[int] = None) -> Any:
+        """Raw bytes of records [start, stop) as a memoryview."""
+        start, stop, _ = slice(start, stop).indices(self.count)
+        size = self.record.size
+        return memoryview(self.mm)[
+            self.offset + start * size:self.offset + max(start, stop) * size
+        ]
+
+    def column(
+        self,
+        name: Optional[str] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> Any:
+        """Values of one field (default: the first) for [start, stop)."""
+        field_index = self.fields.index(name) if name else 0
+        data = self.records(start, stop)
+        code = self.fmt[1:]
+        if (
+            len(self.fields) == 1
+            and code in ("b", "B", "h", "H", "i", "I", "q", "Q", "f", "d")
+            and (self.fmt[0] == "<") == (sys.byteorder == "little")
+        ):
+            return data.cast(code)
+        if self.dtype is not None:
+            view = np.frombuffer(data, dtype=self.dtype)
+            return view[self.fields[field_index]]
+        return [r[field_index] for r in self.record.iter_unpack(data)]
+
+    def windows(
+        self,
+        size: int,
+        name: Optional[str] = None,
+    ) -> Iterator[Any]:
+        """Yield column() chunks of up to size records, in order."""
+        if size < 1:
+            raise ValueError("size must be >= 1")
+        for start in range(0, self.count, size):
+            yield self.column(name, start, start + size)
+
+    def close(self) -> None:
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        self.file.close()
+
+    def __enter__(self) -> "RecordLogReader":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class RecordLogSink:
+    """Stage placed after OutputStage: append transformed fields to a log.
+
+    Writes one record per context from transformed[field] for each of
+    the writer's fields, then passes the context on unchanged.
+    """
+    accepts_context = True
+    stateful = True
+    column_kinds = ("json", "csv", "stream")
+    reads = ("transformed",)
+    writes = ()
+
+    def __init__(self, writer: RecordLogWriter) -> None:
+        self.writer = writer
+
+    def process(self, data: Any) -> Any:
+        self.writer.write(self._row(data))
+        return data
+
+    def process_batch(self, batch: List[Any]) -> List[Any]:
+        self.writer.write_many([self._row(data) for data in batch])
+        return batch
+
+    def process_columns(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        columns = batch["columns"]
+        missing = [f for f in self.writer.fields if f not in columns]
+        if missing:
+            raise ValueError(f"Missing columns for record log: {missing}")
+        self.writer.write_many(
+            zip(*[columns[name] for name in self.writer.fields])
+        )
+        return batch
+
+    def _row(self, data: Any) -> List[Any]:
+        transformed = data.get("transformed")
+        if not isinstance(transformed, dict):
+            raise ValueError("Missing transformed dict")
+        try:
+            return [transformed[name] for name in self.writer.fields]
+        except KeyError as e:
+            raise ValueError(f"Missing transformed field: {e}") from None
+
+
+class CheckpointLog:
+    """Append-only JSON-lines log of checkpoints on local disk.
+
+    append() writes one line and fsyncs it, so a crash loses at most a
+    torn last line, which latest() skips. Every compact_every appends
+    the log is rewritten to its newest entry via a temporary file and
+    os.replace(), so it never holds less than one whole checkpoint.
+    """
+    def __init__(
+        self,
+        path: str,
+        compact_every: int = 64,
+        fsync: bool = True,
+    ) -> None:
+        self.path = path
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.appends = 0
+
+    def append(self, checkpoint: Dict[str, Any]) -> None:
+        line = json.dumps(checkpoint, separators=(",", ":")).encode()
+        with open(self.path, "ab+") as f:
+            # Start on a fresh line if the last write was torn.
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line + b"\n")
+            self._sync(f)
+        self.appends += 1
+        if self.compact_every and self.appends >= self.compact_every:
+            self.compact(checkpoint)
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Return the newest complete checkpoint, or None."""
+        if not os.path.exists(self.path):
+            return None
+        last = None
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                try:
+                    last = json.loads(line)
+                except ValueError:
+                    continue
+        return last
+
+    def compact(self, checkpoint: Optional[Dict[str, Any]] = None) -> None:
+        """Atomically replace the log with just its newest checkpoint."""
+        if checkpoint is None:
+            checkpoint = self.latest()
+            if checkpoint is None:
+                return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(checkpoint, separators=(",", ":")) + "\n")
+            self._sync(f)
+        os.replace(tmp, self.path)
+        self.appends = 0
+        if self.fsync:
+            # Persist the rename itself; not possible on every platform.
+            try:
+                fd = os.open(os.path.dirname(self.path) or ".", os.O_RDONLY)
+            except OSError:
+                return
+            try:
+                os.fsync(fd)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.appends = 0
+
+    def _sync(self, f: Any) -> None:
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+
+@dataclass
+class DeadLetter:
+    """A record that failed, with where and why it failed."""
+    pipeline_id: str
+    record: Any
+    is_context: bool
+    stage: Optional[str]
+    error_type: str
+    error: str
+    traceback: str
+    timestamp: float
+    attempts: int = 1
+
+    @classmethod
+    def capture(
+        cls,
+        pipeline_id: str,
+        record: Any,
+        error: BaseException,
+        attempts: int = 1,
+    ) -> "DeadLetter":
+        is_context = isinstance(record, (dict, PipelineContext))
+        if isinstance(record, PipelineContext):
+            record = record.to_dict()
+        elif isinstance(record, dict):
+            record = dict(record)
+        elif isinstance(record, (bytearray, memoryview)):
+            # The caller may reuse the buffer once we return.
+            record = bytes(record)
+        return cls(
+            pipeline_id,
+            record,
+            is_context,
+            getattr(error, "pipeline_stage", None),
+            type(error).__name__,
+            str(error),
+            "".join(traceback.format_exception(
+                type(error), error, error.__traceback__
+            )),
+            time.time(),
+            attempts,
+        )
+
+
+class DeadLetterStore:
+    """Failed records kept for inspection and bulk replay.
+
+    The newest max_memory letters stay in memory. Beyond that the oldest
+    half is pickled to spill_path, or dropped (and counted in `dropped`)
+    without one. Iteration yields letters oldest first.
+    """
+    def __init__(
+        self,
+        max_memory: int = 1000,
+        spill_path: Optional[str] = None,
+    ) -> None:
+        if max_memory < 1:
+            raise ValueError("max_memory must be >= 1")
+        self.max_memory = max_memory
+        self.spill_path = spill_path
+        self.memory: deque[DeadLetter] = deque()
+        self.spilled = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def add(self, letter: DeadLetter) -> None:
+        with self.lock:
+            self.memory.append(letter)
+            if len(self.memory) > self.max_memory:
+                count = len(self.memory) - self.max_memory // 2
+                oldest = [self.memory.popleft() for _ in range(count)]
+                self._spill(oldest)
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.memory)
+
+    def __iter__(self) -> Iterator[DeadLetter]:
+        with self.lock:
+            memory = list(self.memory)
+            if self.spill_path is not None:
+                spilled = list(self._read_spill(self.spill_path))
+            else:
+                spilled = []
+        return iter(spilled + memory)
+
+    def take(self) -> Iterator[DeadLetter]:
+        """Remove every letter from the store and yield it, oldest first.
+
+        Spilled letters are read back lazily, so letters added while
+        taking are kept for the next take(). Letters not yet yielded
+        when the caller stops early (or closes the generator) are put
+        back; a .taken file left behind by a crash is read first.
+        """
+        with self.lock:
+            memory = deque(self.memory)
+            self.memory.clear()
+            self.spilled = 0
+            taken = None
+            if self.spill_path is not None:
+                taken = self.spill_path + ".taken"
+                if os.path.exists(self.spill_path):
+                    if os.path.exists(taken):
+                        with open(self.spill_path, "rb") as src, \
+                                open(taken, "ab") as dst:
+                            shutil.copyfileobj(src, dst)
+                        os.remove(self.spill_path)
+                    else:
+                        os.replace(self.spill_path, taken)
+                if not os.path.exists(taken):
+                    taken = None
+        read = 0
+        try:
+            if taken is not None:
+                for letter in self._read_spill(taken):
+                    read += 1
+                    yield letter
+                os.remove(taken)
+                taken = None
+            while memory:
+                yield memory.popleft()
+        finally:
+            if taken is not None:
+                self.restore(list(self._read_spill(taken))[read:])
+                os.remove(taken)
+            if memory:
+                with self.lock:
+                    self.memory.extendleft(reversed(memory))
+
+    def restore(self, letters: List[DeadLetter]) -> None:
+        """Put taken letters back ahead of every stored letter."""
+        if not letters:
+            return
+        with self.lock:
+            if self.spill_path is None:
+                self.memory.extendleft(reversed(letters))
+                return
+            tmp = self.spill_path + ".tmp"
+            kept = []
+            with open(tmp, "wb") as f:
+                for letter in letters:
+                    try:
+                        f.write(pickle.dumps(letter))
+                    except Exception:
+                        kept.append(letter)
+                        continue
+                    self.spilled += 1
+                if os.path.exists(self.spill_path):
+                    with open(self.spill_path, "rb") as src:
+                        shutil.copyfileobj(src, f)
+            os.replace(tmp, self.spill_path)
+            # Unpicklable letters never reached the file; keep them
+            # first in memory rather than lose them.
+            self.memory.extendleft(reversed(kept))
+
+    def clear(self) -> None:
+        for _ in self.take():
+            pass
+        self.dropped = 0
+
+    def replay(
+        self,
+        pipeline: "ProcessingPipeline",
+        batch_size: int = 100,
+        sink: Optional[Callable[[List[Any]], None]] = None,
+    ) -> Dict[str, int]:
+        """Re-run every letter through pipeline, batch_size at a time.
+
+        Raw records go through process_batch() and contexts through
+        process_context_batch(); a batch that fails is retried one
+        record at a time and the records that fail again are stored
+        back with the new error. Outputs of each batch go to sink. If
+        sink or the pipeline raises, every letter whose outputs did not
+        reach sink is stored back before the error propagates.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        pid = pipeline.pipeline_id
+        counts = {"replayed": 0, "failed": 0}
+        taken = self.take()
+        pending: List[DeadLetter] = []
+        try:
+            for letters in _shards(taken, batch_size):
+                pending = letters
+                for is_context in (False, True):
+                    self._replay_group(
+                        pipeline, pid, letters, is_context, sink, counts
+                    )
+                    pending = [
+                        x for x in pending if x.is_context != is_context
+                    ]
+        except BaseException:
+            # Close first: take() puts back what it has not yielded,
+            # then the interrupted batch goes back ahead of it.
+            taken.close()
+            self.restore(pending)
+            raise
+        return counts
+
+    def _replay_group(
+        self,
+        pipeline: "ProcessingPipeline",
+        pid: str,
+        letters: List[DeadLetter],
+        is_context: bool,
+        sink: Optional[Callable[[List[Any]], None]],
+        counts: Dict[str, int],
+    ) -> None:
+        group = [x for x in letters if x.is_context == is_context]
+        if not group:
+            return
+        if is_context:
+            run_batch: Callable[[List[Any]], List[Any]] = (
+                pipeline.process_context_batch
+            )
+            run_one: Callable[[Any], Any] = pipeline.process_context
+        else:
+            run_batch = pipeline.process_batch
+            run_one = pipeline.process
+        records = [letter.record for letter in group]
+        failed = []
+        try:
+            outputs = run_batch(records)
+        except Exception:
+            outputs = []
+            for letter in group:
+                try:
+                    outputs.append(run_one(letter.record))
+                except Exception as e:
+                    failed.append(DeadLetter.capture(
+                        pid, letter.record, e, letter.attempts + 1
+                    ))
+        if sink is not None and outputs:
+            sink(outputs)
+        # Only now is the group done; before, a raising sink would have
+        # the originals restored and these stored as well.
+        counts["replayed"] += len(outputs)
+        counts["failed"] += len(failed)
+        for letter in failed:
+            self.add(letter)
+
+    def _spill(self, letters: List[DeadLetter]) -> None:
+        if self.spill_path is None:
+            self.dropped += len(letters)
+            return
+        with open(self.spill_path, "ab") as f:
+            for letter in letters:
+                try:
+                    data = pickle.dumps(letter)
+                except Exception:
+                    self.dropped += 1
+                    continue
+                f.write(data)
+                self.spilled += 1
+
+    @staticmethod
+    def _read_spill(path: str) -> Iterator[DeadLetter]:
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+                except pickle.UnpicklingError:
+                    # A torn final write; everything before it is intact.
+                    return
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a pipeline's breaker is open and there is no backup."""
+
+
+class CircuitBreaker:
+    """Per-pipeline breaker driven by the primary's PipelineStats.
+
+    After every primary call record(stats) snapshots processed_batches
+    and error_count; the failure rate is the error delta over the run
+    delta across the last `window` snapshots, so runs made elsewhere
+    on the same pipeline count too.
+    closed: calls go through; the breaker opens once at least min_calls
+    runs are covered and their failure rate reaches failure_rate.
+    open: calls are refused for reset_after seconds. half-open: a
+    single trial call is let through; success closes the breaker,
+    failure opens it again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        reset_after: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.samples: deque[Tuple[int, int]] = deque(maxlen=window + 1)
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.reset_after = reset_after
+        self.clock = clock
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def allow(self, stats: Optional[PipelineStats] = None) -> bool:
+        """Return True if the primary may be called right now.
+
+        The first call with stats marks where they stand, so the
+        runs before the breaker existed are not counted.
+        """
+        with self.lock:
+            if stats is not None and not self.samples:
+                self.samples.append(self._snapshot(stats))
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_after:
+                    return False
+                self.state = self.HALF_OPEN
+                self.trial_running = False
+            if self.trial_running:
+                return False
+            self.trial_running = True
+            return True
+
+    def record(self, stats: PipelineStats) -> bool:
+        """Read the primary's stats after a call; True if that opened it."""
+        with self.lock:
+            sample = self._snapshot(stats)
+            first = self.samples[0] if self.samples else sample
+            last = self.samples[-1] if self.samples else sample
+            if self.state == self.HALF_OPEN:
+                self.trial_running = False
+                self.samples.clear()
+                self.samples.append(sample)
+                if sample[1] == last[1]:
+                    self.state = self.CLOSED
+                    return False
+                return self._open()
+
+            self.samples.append(sample)
+            runs = sample[0] - first[0]
+            if self.state == self.OPEN or runs < self.min_calls:
+                return False
+            if (sample[1] - first[1]) / runs >= self.failure_rate:
+                return self._open()
+            return False
+
+    @staticmethod
+    def _snapshot(stats: PipelineStats) -> Tuple[int, int]:
+        return stats.processed_batches, stats.error_count
+
+    def _open(self) -> bool:
+        self.state = self.OPEN
+        self.opened_at = self.clock()
+        # The next window starts at the trial call.
+        if self.samples:
+            last = self.samples[-1]
+            self.samples.clear()
+            self.samples.append(last)
+        return True
+
+
+@dataclass
+class DagNode:
+    """One step of a pipeline DAG: run pipeline_id after its upstreams.
+
+    A node with several upstreams is a join: its input is join(inputs)
+    where inputs maps upstream node name to that node's output context.
+    The default join merges the contexts in `after` order.
+    """
+    pipeline_id: str
+    after: List[str] = field(default_factory=list)
+    join: Optional[
+        Callable[[Dict[str, Dict[str, Any]]], Dict[str, Any]]
+    ] = None
+
+
+def merge_contexts(inputs: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Default DAG join: later upstream contexts override earlier keys."""
+    merged: Dict[str, Any] = {}
+    for context in inputs.values():
+        merged.update(context)
+    return merged
+
+
+def _run_dag_node(
+    pipeline: ProcessingPipeline,
+    context: Dict[str, Any],
+) -> Tuple[Dict[str, Any], PipelineStats]:
+    """Process-pool task: run one DAG node on a pickled pipeline copy."""
+    pipeline.stats = PipelineStats(
+        pipeline.pipeline_id, pipeline.pipeline_type,
+        sample_every=pipeline.stats.sample_every,
+    )
+    return pipeline.process_context(context), pipeline.stats
+
+
+_worker_pipelines: List[ProcessingPipeline] = []
+
+
+def _init_worker(pipelines: List[ProcessingPipeline]) -> None:
+    """Install the pipelines a pool worker will run for every shard."""
+    _worker_pipelines[:] = pipelines
+
+
+def _run_shard(
+    shard: List[Any],
+    as_context: bool,
+) -> Tuple[List[Any], List[PipelineStats]]:
+    """Process one shard in a worker and return results plus fresh stats."""
+    unique = _unique(_worker_pipelines)
+    for p in unique:
+        p.stats = PipelineStats(
+            p.pipeline_id, p.pipeline_type,
+            sample_every=p.stats.sample_every,
+        )
+
+    if as_context:
+        results = shard
+        for p in _worker_pipelines:
+            results = p.process_context_batch(results)
+    else:
+        results = _worker_pipelines[0].process_batch(shard)
+    return results, [p.stats for p in unique]
+
+
+def _unique(pipelines: List[ProcessingPipeline]) -> List[ProcessingPipeline]:
+    """Drop repeated pipeline objects so a chain never counts twice."""
+    return list({id(p): p for p in pipelines}.values())
+
+
+def _shards(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Cut an iterable into lists of at most size items, lazily."""
+    it = iter(items)
+    while True:
+        shard = list(islice(it, size))
+        if not shard:
+            return
+        yield shard
+
+
+class CoalescingDispatcher:
+    """Coalesce single-record calls from many threads into batches.
+
+    Each pipeline gets a lane: a queue drained by one daemon thread that
+    waits until max_batch records are queued or max_delay seconds have
+    passed since the first one, runs them with process_batch(), and
+    resolves each caller's Future. If the batch fails, its records are
+    retried one by one so only the bad ones get an exception.
+    """
+    def __init__(
+        self,
+        pipelines: Dict[str, ProcessingPipeline],
+        max_batch: int = 256,
+        max_delay: float = 0.005,
+    ) -> None:
+        if max_batch < 1:
+            raise ValueError("max_batch must be >= 1")
+        self.pipelines = pipelines
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.lanes: Dict[str, "_Lane"] = {}
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def submit(self, pipeline_id: str, data: Any) -> Future:
+        lane = self._lane(pipeline_id)
+        future: Future = Future()
+        with lane.cond:
+            # Checked under the lane lock: _drain() only exits on an
+            # empty queue under it, so nothing can be appended after.
+            if self.closed:
+                raise RuntimeError("CoalescingDispatcher is closed")
+            lane.items.append((data, future))
+            if len(lane.items) == 1 or len(lane.items) >= self.max_batch:
+                lane.cond.notify()
+        return future
+
+    def queue_depth(self) -> Dict[str, int]:
+        return {pid: len(lane.items) for pid, lane in self.lanes.items()}
+
+    def close(self) -> None:
+        """Flush what is queued, then stop every lane thread."""
+        with self.lock:
+            self.closed = True
+            lanes = list(self.lanes.values())
+        for lane in lanes:
+            with lane.cond:
+                lane.cond.notify_all()
+            lane.thread.join()
+
+    def _lane(self, pipeline_id: str) -> "_Lane":
+        lane = self.lanes.get(pipeline_id)
+        if lane is not None:
+            return lane
+        if pipeline_id not in self.pipelines:
+            raise KeyError(f"Pipeline '{pipeline_id}' not found")
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("CoalescingDispatcher is closed")
+            if pipeline_id not in self.lanes:
+                lane = _Lane()
+                lane.thread = threading.Thread(
+                    target=self._drain,
+                    args=(self.pipelines[pipeline_id], lane),
+                    name=f"nexus-coalesce-{pipeline_id}",
+                    daemon=True,
+                )
+                self.lanes[pipeline_id] = lane
+                lane.thread.start()
+            return self.lanes[pipeline_id]
+
+    def _drain(self, pipeline: ProcessingPipeline, lane: "_Lane") -> None:
+        while True:
+            with lane.cond:
+                while not lane.items and not self.closed:
+                    lane.cond.wait()
+                if not lane.items:
+                    return
+                deadline = time.monotonic() + self.max_delay
+                while len(lane.items) < self.max_batch and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    lane.cond.wait(remaining)
+                size = min(len(lane.items), self.max_batch)
+                batch = [lane.items.popleft() for _ in range(size)]
+            self._execute(pipeline, batch)
+
+    def _execute(
+        self,
+        pipeline: ProcessingPipeline,
+        batch: List[Tuple[Any, Future]],
+    ) -> None:
+        live = [(data, f) for data, f in batch
+                if f.set_running_or_notify_cancel()]
+        if not live:
+            return
+        try:
+            outputs = pipeline.process_batch([data for data, _ in live])
+        except Exception:
+            for data, future in live:
+                try:
+                    future.set_result(pipeline.process(data))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        for (_, future), output in zip(live, outputs):
+            future.set_result(output)
+
+
+class _Lane:
+    """Queue, condition and drain thread of one dispatcher pipeline."""
+    def __init__(self) -> None:
+        self.items: deque[Tuple[Any, Future]] = deque()
+        self.cond = threading.Condition()
+        self.thread: threading.Thread
+
+
+class BatchSizeController:
+    """Grow or shrink a batch size to keep per-batch p99 under target.
+
+    observe(stats) reads a pipeline's PipelineStats: the batches in
+    batch_latency and the records and run time counted since the last
+    decision. Every `window` batches their p99 latency (to histogram
+    precision) and records/sec are compared with target_p99 (seconds
+    per batch): above target the size is cut by `shrink`; below
+    target * headroom it grows by `grow`, unless the last growth did
+    not raise throughput; otherwise it holds. Other runs of the same
+    pipeline count too. Each decision is kept in `decisions` and
+    summarised by metrics().
+    """
+    def __init__(
+        self,
+        target_p99: float,
+        initial: int = 64,
+        min_size: int = 1,
+        max_size: int = 4096,
+        window: int = 20,
+        grow: float = 1.25,
+        shrink: float = 0.5,
+        headroom: float = 0.8,
+    ) -> None:
+        if target_p99 <= 0:
+            raise ValueError("target_p99 must be > 0")
+        if not 1 <= min_size <= initial <= max_size:
+            raise ValueError("Need 1 <= min_size <= initial <= max_size")
+        if window < 1 or grow <= 1 or not 0 < shrink < 1:
+            raise ValueError("Need window >= 1, grow > 1, 0 < shrink < 1")
+        self.target_p99 = target_p99
+        self.size = initial
+        self.min_size = min_size
+        self.max_size = max_size
+        self.window = window
+        self.grow = grow
+        self.shrink = shrink
+        self.headroom = headroom
+        self.base: Optional[LatencyHistogram] = None
+        self.base_records = 0
+        self.base_time = 0.0
+        self.last_action = "hold"
+        self.last_throughput = 0.0
+        self.last_p99 = 0.0
+        self.counts = {"grow": 0, "shrink": 0, "hold": 0}
+        self.decisions: deque[Dict[str, Any]] = deque(maxlen=100)
+
+    def observe(self, stats: PipelineStats) -> None:
+        """Decide once window batches were recorded since the last mark.
+
+        The first call only marks where the stats stand.
+        """
+        if self.base is None:
+            self._mark(stats)
+            return
+        if stats.batch_latency.count - self.base.count < self.window:
+            return
+        busy = stats.total_time_sec - self.base_time
+        records = stats.processed_records - self.base_records
+        self._decide(
+            stats.batch_latency.since(self.base).percentile(99),
+            records / busy if busy > 0 else 0.0,
+        )
+        self._mark(stats)
+
+    def _mark(self, stats: PipelineStats) -> None:
+        self.base = stats.batch_latency.snapshot()
+        self.base_records = stats.processed_records
+        self.base_time = stats.total_time_sec
+
+    def _decide(self, p99: float, throughput: float) -> None:
+        old = self.size
+        if p99 > self.target_p99:
+            action = "shrink"
+            self.size = max(self.min_size, int(old * self.shrink))
+        elif (
+            p99 < self.target_p99 * self.headroom
+            and old < self.max_size
+            and not (
+                self.last_action == "grow"
+                and throughput < self.last_throughput
+            )
+        ):
+            action = "grow"
+            self.size = min(self.max_size, max(old + 1, int(old * self.grow)))
+        else:
+            action = "hold"
+        self.counts[action] += 1
+        self.decisions.append({
+            "time": time.time(),
+            "action": action,
+            "old_size": old,
+            "new_size": self.size,
+            "p99": p99,
+            "throughput": throughput,
+        })
+        self.last_action = action
+        self.last_throughput = throughput
+        self.last_p99 = p99
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "batch_size": self.size,
+            "target_p99": self.target_p99,
+            "last_p99": self.last_p99,
+            "last_throughput": self.last_throughput,
+            "grows": self.counts["grow"],
+            "shrinks": self.counts["shrink"],
+            "holds": self.counts["hold"],
+        }
+
+
+class QuotaExceededError(RuntimeError):
+    """Raised when a tenant's queue is full."""
+
+
+class TokenBucket:
+    """Token bucket: rate tokens per second, holding at most burst.
+
+    Not locked; TenantPool only touches it under its own lock.
+    """
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        if self.burst < 1:
+            raise ValueError("burst must be >= 1")
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def available(self) -> float:
+        now = self.clock()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        return self.tokens
+
+    def try_acquire(self, n: float = 1.0) -> bool:
+        if self.available() < n:
+            return False
+        self.tokens -= n
+        return True
+
+    def wait_time(self, n: float = 1.0) -> float:
+        """Seconds until n tokens are available."""
+        return max(0.0, (n - self.available()) / self.rate)
+
+
+@dataclass
+class TenantQuota:
+    """Per-tenant limits: records in flight, records/sec and queue size."""
+    max_concurrency: int = 4
+    rate: Optional[float] = None
+    burst: Optional[float] = None
+    max_queue: int = 1000
+
+
+class _Tenant:
+    """Queue, quota and counters of one TenantPool tenant."""
+    def __init__(self, quota: TenantQuota, clock: Callable[[], float]):
+        self.set_quota(quota, clock)
+        self.queue: deque[Tuple[str, Any, Future]] = deque()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def set_quota(
+        self,
+        quota: TenantQuota,
+        clock: Callable[[], float],
+    ) -> None:
+        if quota.max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        self.quota = quota
+        self.bucket: Optional[TokenBucket] = None
+        if quota.rate is not None:
+            self.bucket = TokenBucket(quota.rate, quota.burst, clock)
+
+
+class TenantPool:
+    """Run many tenants' records on shared workers, fairly and in quota.
+
+    Each tenant has a FIFO queue, a concurrency limit and an optional
+    token bucket (records/sec). Idle workers serve tenants round robin,
+    skipping those at their concurrency limit or out of tokens, so a
+    flooding tenant mostly delays itself; a full queue raises
+    QuotaExceededError.
+
+    With a factory, every worker runs on its own factory(pipeline)
+    instance, made on first use. Without one, pipelines are deep-copied
+    the same way unless a stage sets stateful = True (window state, a
+    record-log writer): those would split their state or open several
+    writers, so all workers share the registered instance, one record
+    at a time. close() merges the copies' stats back.
+    """
+    def __init__(
+        self,
+        pipelines: Dict[str, ProcessingPipeline],
+        workers: int = 4,
+        default_quota: Optional[TenantQuota] = None,
+        factory: Optional[
+            Callable[[ProcessingPipeline], ProcessingPipeline]
+        ] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.pipelines = pipelines
+        self.default_quota = default_quota or TenantQuota()
+        self.factory = factory
+        self.clock = clock
+        self.tenants: Dict[str, _Tenant] = {}
+        self.cursor = 0
+        self.instances: Dict[str, List[ProcessingPipeline]] = {}
+        self.idle: Dict[str, List[ProcessingPipeline]] = {}
+        self.shared: Dict[str, threading.Lock] = {}
+        self.cond = threading.Condition()
+        self.closed = False
+        self.threads = [
+            threading.Thread(
+                target=self._work, name=f"nexus-tenant-{i}", daemon=True
+            )
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def set_quota(self, tenant: str, quota: TenantQuota) -> None:
+        """Set a tenant's quota; records already queued are kept."""
+        with self.cond:
+            state = self.tenants.get(tenant)
+            if state is None:
+                self.tenants[tenant] = _Tenant(quota, self.clock)
+            else:
+                state.set_quota(quota, self.clock)
+            self.cond.notify_all()
+
+    def submit(self, tenant: str, pipeline_id: str, data: Any) -> Future:
+        if pipeline_id not in self.pipelines:
+            raise KeyError(f"Pipeline '{pipeline_id}' not found")
+        future: Future = Future()
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("TenantPool is closed")
+            state = self.tenants.get(tenant)
+            if state is None:
+                state = self.tenants[tenant] = _Tenant(
+                    self.default_quota, self.clock
+                )
+            if len(state.queue) >= state.quota.max_queue:
+                state.rejected += 1
+                raise QuotaExceededError(
+                    f"Queue full for tenant '{tenant}' "
+                    f"({state.quota.max_queue} records)"
+                )
+            state.queue.append((pipeline_id, data, future))
+            self.cond.notify()
+        return future
+
+    def metrics(self) -> Dict[str, Any]:
+        """Per-tenant quota usage and queue depth, per-pipeline instances."""
+        with self.cond:
+            tenants = {}
+            for name, state in self.tenants.items():
+                quota = state.quota
+                bucket = state.bucket
+                tenants[name] = {
+                    "queued": len(state.queue),
+                    "in_flight": state.in_flight,
+                    "completed": state.completed,
+                    "failed": state.failed,
+                    "rejected": state.rejected,
+                    "max_concurrency": quota.max_concurrency,
+                    "max_queue": quota.max_queue,
+                    "rate": quota.rate,
+                    "tokens": None if bucket is None else bucket.available(),
+                }
+            pipelines = {
+                pid: {
+                    "instances": len(made),
+                    "idle": len(self.idle.get(pid, ())),
+                }
+                for pid, made in self.instances.items()
+            }
+            for pid in self.shared:
+                pipelines[pid] = {"instances": 0, "idle": 0, "shared": True}
+        return {
+            "workers": len(self.threads),
+            "tenants": tenants,
+            "pipelines": pipelines,
+        }
+
+    def close(self) -> None:
+        """Finish queued records, stop the workers, merge instance stats."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
+        for pid, made in self.instances.items():
+            for pipeline in made:
+                self.pipelines[pid].stats.merge(pipeline.stats)
+        self.instances.clear()
+        self.idle.clear()
+        self.shared.clear()
+
+    def _next(self) -> Tuple[Optional[_Tenant], Optional[float]]:
+        """Pick the next eligible tenant round robin, or how long to wait."""
+        names = list(self.tenants)
+        wait: Optional[float] = None
+        for k in range(len(names)):
+            state = self.tenants[names[(self.cursor + k) % len(names)]]
+            if not state.queue:
+                continue
+            if state.in_flight >= state.quota.max_concurrency:
+                continue
+            bucket = state.bucket
+            if bucket is not None and not bucket.try_acquire():
+                delay = bucket.wait_time()
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            self.cursor = (self.cursor + k + 1) % len(names)
+            return state, None
+        return None, wait
+
+    def _checkout(
+        self,
+        pipeline_id: str,
+    ) -> Tuple[Optional[ProcessingPipeline], Optional[threading.Lock]]:
+        """Make a worker instance, or the lock of a shared pipeline.
+
+        Called without the pool lock: factories may be slow or raise.
+        """
+        prototype = self.pipelines[pipeline_id]
+        if self.factory is None and any(
+            getattr(stage, "stateful", False) for stage in prototype.stages
+        ):
+            with self.cond:
+                lock = self.shared.setdefault(pipeline_id, threading.Lock())
+            return None, lock
+        pipeline = (self.factory or copy.deepcopy)(prototype)
+        pipeline.stats = PipelineStats(
+            prototype.pipeline_id,
+            prototype.pipeline_type,
+            sample_every=prototype.stats.sample_every,
+        )
+        with self.cond:
+            self.instances.setdefault(pipeline_id, []).append(pipeline)
+        return pipeline, None
+
+    def _work(self) -> None:
+        while True:
+            with self.cond:
+                while True:
+                    state, wait = self._next()
+                    if state is not None:
+                        break
+                    if self.closed and not any(
+                        t.queue for t in self.tenants.values()
+                    ):
+                        return
+                    self.cond.wait(wait)
+                pipeline_id, data, future = state.queue.popleft()
+                state.in_flight += 1
+                idle = self.idle.get(pipeline_id)
+                pipeline = idle.pop() if idle else None
+                lock = self.shared.get(pipeline_id)
+
+            ok = True
+            try:
+                if future.set_running_or_notify_cancel():
+                    if pipeline is None and lock is None:
+                        pipeline, lock = self._checkout(pipeline_id)
+                    if pipeline is not None:
+                        result = pipeline.process(data)
+                    else:
+                        with lock:
+                            result = self.pipelines[pipeline_id].process(
+                                data
+                            )
+                    future.set_result(result)
+            except Exception as e:
+                ok = False
+                future.set_exception(e)
+            finally:
+                with self.cond:
+                    state.in_flight -= 1
+                    if ok:
+                        state.completed += 1
+                    else:
+                        state.failed += 1
+                    if pipeline is not None:
+                        self.idle.setdefault(pipeline_id, []).append(
+                            pipeline
+                        )
+                    self.cond.notify()
+
+
+class NexusManager:
+    """Orchestrate multiple pipelines polymorphically."""
+    def __init__(self) -> None:
+        self.pipelines: Dict[str, ProcessingPipeline] = {}
+        self.error_log: deque[str] = deque(maxlen=50)
+        self.dead_letters = DeadLetterStore()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self.dispatcher: Optional[CoalescingDispatcher] = None
+        self.tenancy: Optional[TenantPool] = None
+        self.batch_controllers: Dict[str, BatchSizeController] = {}
+
+    def register(self, pipeline: ProcessingPipeline) -> None:
+        self.pipelines[pipeline.pipeline_id] = pipeline
+
+    def breaker(self, pipeline_id: str) -> CircuitBreaker:
+        """Return the pipeline's circuit breaker, creating a default one."""
+        if pipeline_id not in self.breakers:
+            self.breakers[pipeline_id] = CircuitBreaker()
+        return self.breakers[pipeline_id]
+
+    def run_pipeline(self, pipeline_id: str, data: Any) -> Union[str, Any]:
+        if pipeline_id not in self.pipelines:
+            raise KeyError(f"Pipeline '{pipeline_id}' not found")
+        try:
+            if self.dispatcher is not None:
+                return self.dispatcher.submit(pipeline_id, data).result()
+            return self.pipelines[pipeline_id].process(data)
+        except Exception as e:
+            self.dead_letter(pipeline_id, data, e)
+            raise
+
+    def dead_letter(
+        self,
+        pipeline_id: str,
+        record: Any,
+        error: BaseException,
+    ) -> None:
+        """Keep a failed record in dead_letters for later replay."""
+        self.dead_letters.add(DeadLetter.capture(pipeline_id, record, error))
+
+    def replay_dead_letters(
+        self,
+        pipeline_id: str,
+        batch_size: int = 100,
+        sink: Optional[Callable[[List[Any]], None]] = None,
+    ) -> Dict[str, int]:
+        """Re-run every dead letter through the given pipeline."""
+        if pipeline_id not in self.pipelines:
+            raise KeyError(f"Pipeline '{pipeline_id}' not found")
+        return self.dead_letters.replay(
+            self.pipelines[pipeline_id], batch_size, sink
+        )
+
+    def submit(self, pipeline_id: str, data: Any) -> Future:
+        """Queue one record for coalesced batch execution."""
+        dispatcher = self.dispatcher or self.enable_coalescing()
+        return dispatcher.submit(pipeline_id, data)
+
+    def enable_coalescing(
+        self,
+        max_batch: int = 256,
+        max_delay: float = 0.005,
+    ) -> CoalescingDispatcher:
+        """Route run_pipeline() through a micro-batching dispatcher.
+
+        Each call then waits at most max_delay seconds (plus the batch's
+        run time) in exchange for batch throughput.
+        """
+        if self.dispatcher is not None:
+            self.dispatcher.close()
+        self.dispatcher = CoalescingDispatcher(
+            self.pipelines, max_batch, max_delay
+        )
+        return self.dispatcher
+
+    def enable_tenancy(
+        self,
+        workers: int = 4,
+        default_quota: Optional[TenantQuota] = None,
+        factory: Optional[
+            Callable[[ProcessingPipeline], ProcessingPipeline]
+        ] = None,
+    ) -> TenantPool:
+        """Serve run_for_tenant() from a quota-enforcing TenantPool."""
+        if self.tenancy is not None:
+            self.tenancy.close()
+        self.tenancy = TenantPool(
+            self.pipelines, workers, default_quota, factory
+        )
+        return self.tenancy
+
+    def submit_for_tenant(
+        self,
+        tenant: str,
+        pipeline_id: str,
+        data: Any,
+    ) -> Future:
+        pool = self.tenancy or self.enable_tenancy()
+        return pool.submit(tenant, pipeline_id, data)
+
+    def run_for_tenant(
+        self,
+        tenant: str,
+        pipeline_id: str,
+        data: Any,
+    ) -> Union[str, Any]:
+        """Like run_pipeline(), but queued and limited per tenant."""
+        future = self.submit_for_tenant(tenant, pipeline_id, data)
+        try:
+            return future.result()
+        except Exception as e:
+            self.dead_letter(pipeline_id, data, e)
+            raise
+
+    def run_batch(self, pipeline_id: str, records: List[Any]) -> List[Any]:
+        if pipeline_id not in self.pipelines:
+            raise KeyError(f"Pipeline '{pipeline_id}' not found")
+        return self.pipelines[pipeline_id].process_batch(records)
+
+    def run_adaptive(
+        self,
+        pipeline_id: str,
+        records: Iterable[Any],
+        controller: Optional[BatchSizeController] = None,
+        target_p99: float = 0.05,
+    ) -> Iterator[str]:
+        """Lazily process records in batches sized by a controller.
+
+        After each process_batch() the controller (by default the
+        pipeline's own, created with target_p99) observes the pipeline's
+        stats and sets the size of the next batch. Yields outputs in
+        order.
+        """
+        if pipeline_id not in self.pipelines:
+            raise KeyError(f"Pipeline '{pipeline_id}' not found")
+        pipeline = self.pipelines[pipeline_id]
+        if controller is None:
+            controller = self.batch_controllers.get(pipeline_id)
+            if controller is None:
+                controller = BatchSizeController(target_p99)
+        self.batch_controllers[pipeline_id] = controller
+
+        it = iter(records)
+        controller.observe(pipeline.stats)
+        while True:
+            batch = list(islice(it, controller.size))
+            if not batch:
+                return
+            outputs = pipeline.process_batch(batch)
+            controller.observe(pipeline.stats)
+            yield from outputs
+
+    def run_checkpointed(
+        self,
+        pipeline_id: str,
+        records: Iterable[Any],
+        log: CheckpointLog,
+        every: int = 1000,
+        sink: Optional[Callable[[List[str], int], None]] = None,
+        skip_failed: bool = False,
+    ) -> int:
+        """Process records in checkpointed batches; resume after a crash.
+
+        Each batch of `every` records goes through process_batch(), its
+        outputs to sink(outputs, offset), and then the input offset with
+        the pipeline's stats and stage state is appended to log. Run
+        again with the same log and input, records before the last
+        checkpoint are skipped and state is restored, so none is
+        processed twice. A batch cut short between sink() and its
+        checkpoint is delivered again; sinks can dedupe on offset.
+        With skip_failed, a failing batch is retried record by record
+        and the bad records are dead-lettered instead of ending the run.
+        Returns the offset reached.
+        """
+        if every < 1:
+            raise ValueError("every must be >= 1")
+        pipeline = self.pipelines[pipeline_id]
+        offset = 0
+        checkpoint = log.latest()
+        if checkpoint is not None:
+            if checkpoint["pipeline_id"] != pipeline_id:
+                raise ValueError(
+                    f"Checkpoint is for pipeline "
+                    f"'{checkpoint['pipeline_id']}', not '{pipeline_id}'"
+                )
+            offset = checkpoint["offset"]
+            pipeline.set_state(checkpoint["state"])
+
+        it = iter(records)
+        for _ in islice(it, offset):
+            pass
+        for batch in _shards(it, every):
+            try:
+                outputs = pipeline.process_batch(batch)
+            except Exception:
+                if not skip_failed:
+                    raise
+                outputs = []
+                for data in batch:
+                    try:
+                        outputs.append(pipeline.process(data))
+                    except Exception as e:
+                        self.dead_letter(pipeline_id, data, e)
+            offset += len(batch)
+            if sink is not None:
+                sink(outputs, offset)
+            log.append({
+                "pipeline_id": pipeline_id,
+                "offset": offset,
+                "time": time.time(),
+                "state": pipeline.get_state(),
+            })
+        return offset
 
+    def run_parallel(
+        self,
+        pipeline_id: str,
+        records: Iterable[Any],
+        workers: Optional[int] = None,
+        shard_size: int = 1000,
+    ) -> List[Any]:
+        """Shard records across a process pool, keeping input order."""
+        if pipeline_id not in self.pipelines:
+            raise KeyError(f"Pipeline '{pipeline_id}' not found")
+        return self._run_sharded(
+            [self.pipelines[pipeline_id]], records, False, workers, shard_size
+        )
 
-class ProcessingStage(Protocol):
-    """Duck-typed stage interface: any object with process(data) is a stage."""
-    def process(self, data: Any) -> Any:
-        ...
+    def chain_parallel(
+        self,
+        pipeline_ids: List[str],
+        contexts: Iterable[Dict[str, Any]],
+        workers: Optional[int] = None,
+        shard_size: int = 1000,
+    ) -> List[Dict[str, Any]]:
+        """Chain many contexts through pipelines on a process pool."""
+        pipelines = [self.pipelines[pid] for pid in pipeline_ids]
+        return self._run_sharded(
+            pipelines, contexts, True, workers, shard_size
+        )
 
+    def _run_sharded(
+        self,
+        pipelines: List[ProcessingPipeline],
+        items: Iterable[Any],
+        as_context: bool,
+        workers: Optional[int],
+        shard_size: int,
+    ) -> List[Any]:
+        if shard_size < 1:
+            raise ValueError("shard_size must be >= 1")
 
-class InputStage:
-    """Stage 1: validate the shared context structure."""
-    def process(self, data: Any) -> Any:
-        if not isinstance(data, dict):
-            raise ValueError("InputStage expects a dict context")
+        workers = workers or os.cpu_count() or 1
+        results: List[Any] = []
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(pipelines,),
+        ) as pool:
+            # Bound the shards in flight so a huge iterable is never
+            # materialised in full; futures are drained in input order.
+            limit = 2 * workers
+            pending: deque[Future] = deque()
+            for shard in _shards(items, shard_size):
+                pending.append(pool.submit(_run_shard, shard, as_context))
+                if len(pending) >= limit:
+                    self._merge_shard(pipelines, pending.popleft(), results)
+            while pending:
+                self._merge_shard(pipelines, pending.popleft(), results)
+        return results
 
-        required = ("kind", "raw", "parsed")
-        if any(k not in data for k in required):
-            raise ValueError("Missing required context keys: kind/raw/parsed")
+    def _merge_shard(
+        self,
+        pipelines: List[ProcessingPipeline],
+        future: Future,
+        results: List[Any],
+    ) -> None:
+        shard_results, shard_stats = future.result()
+        results.extend(shard_results)
+        for p, stats in zip(_unique(pipelines), shard_stats):
+            p.stats.merge(stats)
 
-        data["validated"] = True
+    def chain_context(
+        self,
+        pipeline_ids: List[str],
+        context: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        data = context
+        for pid in pipeline_ids:
+            data = self.pipelines[pid].process_context(data)
         return data
 
+    def run_dag(
+        self,
+        nodes: Dict[str, DagNode],
+        context: Dict[str, Any],
+        executor: str = "thread",
+        workers: Optional[int] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Run a DAG of pipelines, overlapping independent branches.
 
-class TransformStage:
-    """Stage 2: enrich and transform based on data kind."""
-    def __init__(self, verbose: bool = True) -> None:
-        self.verbose = verbose
+        Every node starts as soon as all of its upstream nodes are done,
+        on a thread pool (shared pipeline objects) or a process pool
+        (pickled pipeline copies whose stats are merged back). Each
+        node gets its own shallow copy of its input context. Returns
+        every node's output context; the first failure is re-raised.
+        """
+        order = self._dag_order(nodes)
+        if executor == "thread":
+            pool: Executor = ThreadPoolExecutor(max_workers=workers)
+        elif executor == "process":
+            pool = ProcessPoolExecutor(max_workers=workers)
+        else:
+            raise ValueError(f"Unknown executor: {executor}")
 
-    def process(self, data: Any) -> Any:
-        if not isinstance(data, dict):
-            raise ValueError("TransformStage expects a dict context")
+        results: Dict[str, Dict[str, Any]] = {}
+        running: Dict[Future, str] = {}
+        waiting = list(order)
+        with pool:
+            while waiting or running:
+                for name in [n for n in waiting
+                             if all(u in results for u in nodes[n].after)]:
+                    waiting.remove(name)
+                    future = self._submit_dag_node(
+                        pool, executor, nodes[name],
+                        self._dag_input(nodes[name], context, results),
+                    )
+                    running[future] = name
 
-        kind = data.get("kind")
-        parsed = data.get("parsed")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        out = future.result()
+                    except Exception:
+                        for other in running:
+                            other.cancel()
+                        raise
+                    if executor == "process":
+                        out, stats = out
+                        self.pipelines[nodes[name].pipeline_id].stats.merge(
+                            stats
+                        )
+                    results[name] = out
+        return results
 
-        data["metadata"] = {"timestamp": time.time(), "enriched": True}
+    def _dag_order(self, nodes: Dict[str, DagNode]) -> List[str]:
+        """Validate the DAG and return its nodes in topological order."""
+        for name, node in nodes.items():
+            if node.pipeline_id not in self.pipelines:
+                raise KeyError(f"Pipeline '{node.pipeline_id}' not found")
+            missing = [u for u in node.after if u not in nodes]
+            if missing:
+                raise ValueError(f"Node '{name}' depends on unknown {missing}")
 
-        if kind == "json":
-            print("Transform: Enriched with metadata and validation")
-            if not isinstance(parsed, dict):
-                raise ValueError("JSON parsed data must be a dict")
+        order: List[str] = []
+        placed = set()
+        pending = list(nodes)
+        while pending:
+            ready = [n for n in pending
+                     if all(u in placed for u in nodes[n].after)]
+            if not ready:
+                raise ValueError(f"Pipeline DAG has a cycle among {pending}")
+            for name in ready:
+                pending.remove(name)
+                placed.add(name)
+                order.append(name)
+        return order
 
-            sensor = str(parsed.get("sensor", "unknown"))
-            value = parsed.get("value")
-            unit = str(parsed.get("unit", ""))
+    def _dag_input(
+        self,
+        node: DagNode,
+        context: Dict[str, Any],
+        results: Dict[str, Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        if not node.after:
+            return dict(context)
+        if len(node.after) == 1 and node.join is None:
+            return dict(results[node.after[0]])
+        join = node.join or merge_contexts
+        return join({u: dict(results[u]) for u in node.after})
 
-            if not isinstance(value, (int, float)):
-                raise ValueError("JSON 'value' must be numeric")
+    def _submit_dag_node(
+        self,
+        pool: Executor,
+        executor: str,
+        node: DagNode,
+        context: Dict[str, Any],
+    ) -> Future:
+        pipeline = self.pipelines[node.pipeline_id]
+        if executor == "process":
+            return pool.submit(_run_dag_node, pipeline, context)
+        return pool.submit(pipeline.process_context, context)
 
-            status = "Normal range"
-            if sensor.lower() in ("temp", "temperature") and value >= 30:
-                status = "High"
-            if sensor.lower() in ("temp", "temperature") and value <= 10:
-                status = "Low"
+    def run_with_recovery(
+        self,
+        pipeline_id: str,
+        context: Dict[str, Any],
+        backup_pipeline: Optional[ProcessingPipeline] = None,
+        hedge_after: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Run the primary pipeline, falling back to backup_pipeline.
 
-            data["transformed"] = {
-                "sensor": sensor,
-                "value": float(value),
-                "unit": unit,
-                "status": status,
-            }
-            return data
+        While the primary's breaker is open, records go straight to the
+        backup (or CircuitOpenError is raised without one). With
+        hedge_after (seconds) the primary runs on a thread and, once it
+        exceeds that budget, the backup is raced against it on its own
+        copy of the context; the first success wins. A record that is
+        not recovered is dead-lettered under pipeline_id.
+        """
+        try:
+            return self._run_with_recovery(
+                pipeline_id, context, backup_pipeline, hedge_after
+            )
+        except Exception as e:
+            self.dead_letter(pipeline_id, context, e)
+            raise
 
-        if kind == "csv":
-            print("Transform: Parsed and structured data")
-            if not isinstance(parsed, dict) or "fields" not in parsed:
-                raise ValueError("CSV parsed data must contain 'fields'")
+    def _run_with_recovery(
+        self,
+        pipeline_id: str,
+        context: Dict[str, Any],
+        backup_pipeline: Optional[ProcessingPipeline],
+        hedge_after: Optional[float],
+    ) -> Dict[str, Any]:
+        breaker = self.breaker(pipeline_id)
+        if not breaker.allow(self.pipelines[pipeline_id].stats):
+            if backup_pipeline is None:
+                raise CircuitOpenError(
+                    f"Circuit open for pipeline '{pipeline_id}'"
+                )
+            return backup_pipeline.process_context(context)
 
-            fields = parsed["fields"]
-            if not isinstance(fields, list):
-                raise ValueError("CSV 'fields' must be a list")
+        if hedge_after is not None and backup_pipeline is not None:
+            return self._run_hedged(
+                pipeline_id, context, backup_pipeline, hedge_after
+            )
 
-            data["transformed"] = {
-                "fields": [str(x).strip() for x in fields],
-                "actions_processed": 1,
-            }
-            return data
+        try:
+            out_ctx = self.pipelines[pipeline_id].process_context(context)
+        except Exception as e:
+            msg = f"Error detected in Stage 2: {e}"
+            self.error_log.append(msg)
+            self._record_outcome(pipeline_id)
+            print(msg)
+            print("Recovery initiated: Switching to backup processor")
 
-        if kind == "stream":
-            print("Transform: Aggregated and filtered")
-            if not isinstance(parsed, dict) or "readings" not in parsed:
-                raise ValueError("Stream parsed must contain 'readings'")
+            if backup_pipeline is None:
+                raise
 
-            readings = parsed["readings"]
-            if not isinstance(readings, list):
-                raise ValueError("Stream 'readings' must be a list")
+            out_ctx = backup_pipeline.process_context(context)
+            print("Recovery successful: Pipeline restored, processing resumed")
+            return out_ctx
+        self._record_outcome(pipeline_id)
+        return out_ctx
 
-            numeric = [float(x) for x in readings
-                       if isinstance(x, (int, float))]
-            if not numeric:
-                raise ValueError("No numeric readings in stream")
+    def _record_outcome(self, pipeline_id: str) -> None:
+        """Feed the primary's stats to its breaker; log when it opens."""
+        stats = self.pipelines[pipeline_id].stats
+        if self.breaker(pipeline_id).record(stats):
+            self.error_log.append(
+                f"Circuit opened for {pipeline_id}: routing to backup"
+            )
 
-            avg_val = sum(numeric) / len(numeric)
-            data["transformed"] = {"count": len(numeric), "avg": avg_val}
-            return data
+    def _run_hedged(
+        self,
+        pipeline_id: str,
+        context: Dict[str, Any],
+        backup_pipeline: ProcessingPipeline,
+        hedge_after: float,
+    ) -> Dict[str, Any]:
+        if self._hedge_pool is None:
+            self._hedge_pool = ThreadPoolExecutor(
+                thread_name_prefix="nexus-hedge"
+            )
+        pool = self._hedge_pool
 
-        raise ValueError(f"Unknown kind: {kind}")
+        def primary_done(future: Future) -> None:
+            error = future.exception()
+            if error is not None:
+                self.error_log.append(f"Error detected in Stage 2: {error}")
+            self._record_outcome(pipeline_id)
 
+        primary = pool.submit(
+            self.pipelines[pipeline_id].process_context, dict(context)
+        )
+        primary.add_done_callback(primary_done)
 
-class OutputStage:
-    """Stage 3: format a human-readable output string."""
-    def process(self, data: Any) -> Any:
-        if not isinstance(data, dict):
-            raise ValueError("OutputStage expects a dict context")
+        def adopt(result: Dict[str, Any]) -> Dict[str, Any]:
+            # The racers ran on copies; update the caller's context in
+            # place, as the unhedged path does.
+            context.clear()
+            context.update(result)
+            return context
 
-        kind = data.get("kind")
-        transformed = data.get("transformed")
+        wait([primary], timeout=hedge_after)
+        if primary.done():
+            if primary.exception() is None:
+                return adopt(primary.result())
+            return backup_pipeline.process_context(context)
 
-        if not isinstance(transformed, dict):
-            raise ValueError("Missing transformed dict")
+        pending = {
+            primary,
+            pool.submit(backup_pipeline.process_context, dict(context)),
+        }
+        errors: List[BaseException] = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    return adopt(future.result())
+                errors.append(error)
+        raise errors[-1]
 
-        if kind == "json":
-            value = float(transformed["value"])
-            status = transformed["status"]
-            data["output"] = (
-                "Processed temperature reading: "
-                f"{value:.1f}°C ({status})"
+    def close(self) -> None:
+        """Stop the dispatcher, tenant pool and hedging pool, if started."""
+        if self.dispatcher is not None:
+            self.dispatcher.close()
+            self.dispatcher = None
+        if self.tenancy is not None:
+            self.tenancy.close()
+            self.tenancy = None
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+            self._hedge_pool = None
+
+    def report(self) -> None:
+        for pid, p in self.pipelines.items():
+            s = p.stats
+            eff = s.efficiency() * 100.0
+            print(
+                f"[Stats] {pid}({p.pipeline_type}): "
+                f"runs={s.processed_batches}, "
+                f"records={s.processed_records}, "
+                f"errors={s.error_count}, "
+                f"time={s.total_time_sec:.3f}s, "
+                f"efficiency={eff:.1f}%"
+            )
+            if s.cache_hits or s.cache_misses:
+                lookups = s.cache_hits + s.cache_misses
+                print(
+                    f"  [Cache] hits={s.cache_hits}, "
+                    f"misses={s.cache_misses}, "
+                    f"hit_rate={s.cache_hits / lookups * 100.0:.1f}%"
+                )
+            if s.run_latency.count:
+                print(f"  [Latency] run: {s.run_latency.summary()}")
+            for name, hist in s.stage_latency.items():
+                print(f"  [Latency] {name}: {hist.summary()}")
+        for pid, controller in self.batch_controllers.items():
+            m = controller.metrics()
+            print(
+                f"[Batch] {pid}: size={m['batch_size']}, "
+                f"p99={m['last_p99'] * 1e3:.2f}ms "
+                f"(target {m['target_p99'] * 1e3:.2f}ms), "
+                f"grows={m['grows']}, shrinks={m['shrinks']}, "
+                f"holds={m['holds']}"
+            )
+        dlq = self.dead_letters
+        if len(dlq) or dlq.dropped:
+            print(
+                f"[DeadLetters] stored={len(dlq)}, "
+                f"spilled={dlq.spilled}, dropped={dlq.dropped}"
             )
-            return data
 
-        if kind == "csv":
-            count = int(transformed.get("actions_processed", 0))
-            data["output"] = f"User activity logged: {count} actions processed"
-            return data
 
-        if kind == "stream":
-            count = int(transformed["count"])
-            avg_val = float(transformed["avg"])
-            data["output"] = (
-                f"Stream summary: {count} readings, avg: {avg_val:.1f}°C"
-            )
-            return data
+class AsyncProcessingStage(Protocol):
+    """Stage whose process() is a coroutine; usable in async pipelines."""
+    async def process(self, data: Any) -> Any:
+        ...
 
-        raise ValueError(f"Unknown kind: {kind}")
 
+class _StreamFailure:
+    """Carry a per-record exception through the async stage queues."""
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
 
-class ProcessingPipeline(ABC):
-    """Abstract pipeline base class with configurable stages."""
-    def __init__(self, pipeline_id: str, pipeline_type: str) -> None:
-        self.pipeline_id = pipeline_id
-        self.pipeline_type = pipeline_type
-        self.stages: List[ProcessingStage] = [
-            InputStage(),
-            TransformStage(),
-            OutputStage(),
-        ]
-        self.stats = PipelineStats(pipeline_id, pipeline_type)
 
-    def run_stages(self, context: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute stages in order and return the updated context."""
+_STREAM_DONE = object()
+
+
+class AsyncProcessingPipeline:
+    """Run a pipeline's stages on asyncio; stages may be coroutines.
+
+    stream() connects the stages with bounded queues, one set of worker
+    tasks per stage, so a slow stage applies backpressure upstream.
+    With concurrency=1 outputs keep input order; with more workers per
+    stage they are yielded in completion order.
+    """
+    def __init__(
+        self,
+        pipeline: ProcessingPipeline,
+        maxsize: int = 64,
+        concurrency: int = 1,
+    ) -> None:
+        if maxsize < 1 or concurrency < 1:
+            raise ValueError("maxsize and concurrency must be >= 1")
+        self.pipeline = pipeline
+        self.maxsize = maxsize
+        self.concurrency = concurrency
+
+    @property
+    def pipeline_id(self) -> str:
+        return self.pipeline.pipeline_id
+
+    @property
+    def stats(self) -> PipelineStats:
+        return self.pipeline.stats
+
+    async def run_stages(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute stages in order, awaiting any coroutine stages."""
         data: Any = context
-        for stage in self.stages:
-            data = stage.process(data)
-            if not isinstance(data, dict):
-                raise ValueError("Pipeline stages must return dict context")
+        for stage in self.pipeline.stages:
+            data = await _call_stage(stage, data)
         return data
 
-    def process_context(self, context: Dict[str, Any]) -> Dict[str, Any]:
-        """Run stages with timing/error stats, but without adapter parsing."""
+    async def process_context(
+        self,
+        context: Dict[str, Any],
+    ) -> Dict[str, Any]:
         start = time.perf_counter()
         ok = True
         try:
-            return self.run_stages(context)
+            return await self.run_stages(context)
         except Exception:
             ok = False
             raise
         finally:
             self.stats.add_run(time.perf_counter() - start, ok)
 
-    @abstractmethod
-    def process(self, data: Any) -> Union[str, Any]:
-        ...
-
-
-class JSONAdapter(ProcessingPipeline):
-    """Adapter: parse JSON string to context, then run shared stages."""
-    def __init__(self, pipeline_id: str) -> None:
-        super().__init__(pipeline_id, "JSON")
-
-    def process(self, data: Any) -> str:
+    async def process(self, data: Any) -> str:
         start = time.perf_counter()
         ok = True
         try:
-            if not isinstance(data, str):
-                raise ValueError("JSONAdapter expects a JSON string")
-
-            parsed = json.loads(data)
-            context: Dict[str, Any] = {
-                "kind": "json",
-                "raw": data,
-                "parsed": parsed,
-            }
-            context = self.run_stages(context)
+            context = self.pipeline.build_context(data)
+            context = await self.run_stages(context)
             return str(context["output"])
         except Exception:
             ok = False
@@ -228,135 +4328,157 @@ class JSONAdapter(ProcessingPipeline):
         finally:
             self.stats.add_run(time.perf_counter() - start, ok)
 
+    async def stream(
+        self,
+        records: Union[Iterable[Any], AsyncIterable[Any]],
+    ) -> AsyncIterator[str]:
+        """Yield one output per record; the first failure is re-raised."""
+        stages = self.pipeline.stages
+        queues: List[asyncio.Queue] = [
+            asyncio.Queue(self.maxsize) for _ in range(len(stages) + 1)
+        ]
+        tasks = [asyncio.ensure_future(self._feed(records, queues[0]))]
+        for i, stage in enumerate(stages):
+            remaining = [self.concurrency]
+            for _ in range(self.concurrency):
+                tasks.append(asyncio.ensure_future(self._work(
+                    stage, queues[i], queues[i + 1], remaining
+                )))
 
-class CSVAdapter(ProcessingPipeline):
-    """Adapter: parse CSV header string into fields, then run shared stages."""
-    def __init__(self, pipeline_id: str) -> None:
-        super().__init__(pipeline_id, "CSV")
-
-    def process(self, data: Any) -> str:
-        start = time.perf_counter()
-        ok = True
         try:
-            if not isinstance(data, str):
-                raise ValueError("CSVAdapter expects a CSV string")
-
-            fields = [x.strip() for x in data.split(",") if x.strip()]
-            context: Dict[str, Any] = {
-                "kind": "csv",
-                "raw": data,
-                "parsed": {"fields": fields},
-            }
-            context = self.run_stages(context)
-            return str(context["output"])
-        except Exception:
-            ok = False
-            raise
+            while True:
+                item = await queues[-1].get()
+                if item is _STREAM_DONE:
+                    break
+                start, data = item
+                ok = not isinstance(data, _StreamFailure)
+                self.stats.add_run(time.perf_counter() - start, ok)
+                if not ok:
+                    raise data.error
+                yield str(data["output"])
         finally:
-            self.stats.add_run(time.perf_counter() - start, ok)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
+    async def _feed(
+        self,
+        records: Union[Iterable[Any], AsyncIterable[Any]],
+        out: asyncio.Queue,
+    ) -> None:
+        if isinstance(records, AsyncIterable):
+            async for record in records:
+                await out.put(self._context_item(record))
+        else:
+            for record in records:
+                await out.put(self._context_item(record))
+        await out.put(_STREAM_DONE)
 
-class StreamAdapter(ProcessingPipeline):
-    """Adapter: wrap numeric readings as a stream context, then run stages."""
-    def __init__(self, pipeline_id: str) -> None:
-        super().__init__(pipeline_id, "STREAM")
-
-    def process(self, data: Any) -> str:
+    def _context_item(self, record: Any) -> Tuple[float, Any]:
         start = time.perf_counter()
-        ok = True
         try:
-            if isinstance(data, str):
-                raise ValueError(
-                    "StreamAdapter expects numeric readings list, not a string"
-                )
-            if not isinstance(data, list):
-                raise ValueError("StreamAdapter expects a list of readings")
+            return start, self.pipeline.build_context(record)
+        except Exception as e:
+            return start, _StreamFailure(e)
 
-            context: Dict[str, Any] = {
-                "kind": "stream",
-                "raw": "Real-time sensor stream",
-                "parsed": {"readings": data},
-            }
-            context = self.run_stages(context)
-            return str(context["output"])
-        except Exception:
-            ok = False
-            raise
-        finally:
-            self.stats.add_run(time.perf_counter() - start, ok)
+    async def _work(
+        self,
+        stage: Any,
+        inbox: asyncio.Queue,
+        out: asyncio.Queue,
+        remaining: List[int],
+    ) -> None:
+        while True:
+            item = await inbox.get()
+            if item is _STREAM_DONE:
+                # Let sibling workers see the marker too; the last one
+                # to stop forwards it downstream.
+                await inbox.put(_STREAM_DONE)
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    await out.put(_STREAM_DONE)
+                return
 
+            start, data = item
+            if not isinstance(data, _StreamFailure):
+                try:
+                    data = await _call_stage(stage, data)
+                except Exception as e:
+                    data = _StreamFailure(e)
+            await out.put((start, data))
 
-class NexusManager:
-    """Orchestrate multiple pipelines polymorphically."""
-    def __init__(self) -> None:
-        self.pipelines: Dict[str, ProcessingPipeline] = {}
-        self.error_log: deque[str] = deque(maxlen=50)
+
+async def _call_stage(stage: Any, data: Any) -> Any:
+    """Run one stage on one context, awaiting it if it is a coroutine."""
+    result = stage.process(data)
+    if inspect.isawaitable(result):
+        result = await result
+    if not isinstance(result, dict):
+        raise ValueError("Pipeline stages must return dict context")
+    return result
+
+
+class AsyncNexusManager(NexusManager):
+    """NexusManager with asyncio entry points that never block on stages."""
+    def __init__(self, maxsize: int = 64, concurrency: int = 1) -> None:
+        super().__init__()
+        self.maxsize = maxsize
+        self.concurrency = concurrency
+        self.async_pipelines: Dict[str, AsyncProcessingPipeline] = {}
 
     def register(self, pipeline: ProcessingPipeline) -> None:
-        self.pipelines[pipeline.pipeline_id] = pipeline
+        super().register(pipeline)
+        self.async_pipelines[pipeline.pipeline_id] = AsyncProcessingPipeline(
+            pipeline, self.maxsize, self.concurrency
+        )
 
-    def run_pipeline(self, pipeline_id: str, data: Any) -> Union[str, Any]:
-        if pipeline_id not in self.pipelines:
+    async def run_async(self, pipeline_id: str, data: Any) -> str:
+        if pipeline_id not in self.async_pipelines:
             raise KeyError(f"Pipeline '{pipeline_id}' not found")
-        return self.pipelines[pipeline_id].process(data)
+        return await self.async_pipelines[pipeline_id].process(data)
 
-    def chain_context(
+    def stream(
+        self,
+        pipeline_id: str,
+        records: Union[Iterable[Any], AsyncIterable[Any]],
+    ) -> AsyncIterator[str]:
+        if pipeline_id not in self.async_pipelines:
+            raise KeyError(f"Pipeline '{pipeline_id}' not found")
+        return self.async_pipelines[pipeline_id].stream(records)
+
+    async def chain_async(
         self,
         pipeline_ids: List[str],
         context: Dict[str, Any],
     ) -> Dict[str, Any]:
         data = context
         for pid in pipeline_ids:
-            data = self.pipelines[pid].process_context(data)
+            data = await self.async_pipelines[pid].process_context(data)
         return data
 
-    def run_with_recovery(
-        self,
-        pipeline_id: str,
-        context: Dict[str, Any],
-        backup_pipeline: Optional[ProcessingPipeline] = None,
-    ) -> Dict[str, Any]:
-        try:
-            return self.pipelines[pipeline_id].process_context(context)
-        except Exception as e:
-            msg = f"Error detected in Stage 2: {e}"
-            self.error_log.append(msg)
-            print(msg)
-            print("Recovery initiated: Switching to backup processor")
-
-            if backup_pipeline is None:
-                raise
-
-            out_ctx = backup_pipeline.process_context(context)
-            print("Recovery successful: Pipeline restored, processing resumed")
-            return out_ctx
-
-    def report(self) -> None:
-        for pid, p in self.pipelines.items():
-            s = p.stats
-            eff = s.efficiency() * 100.0
-            print(
-                f"[Stats] {pid}({p.pipeline_type}): "
-                f"runs={s.processed_batches}, "
-                f"errors={s.error_count}, "
-                f"time={s.total_time_sec:.3f}s, "
-                f"efficiency={eff:.1f}%"
-            )
-
 
 class FailingTransformStage:
     """Deliberately fail to demonstrate recovery."""
+    reads = ()
+    writes = ()
+
     def process(self, data: Any) -> Any:
         raise ValueError("Invalid data format")
 
 
 class SafeTransformStage:
     """Fallback transform that guarantees a transformed output."""
+    reads = ("kind", "parsed")
+    writes = ("metadata", "transformed")
+    optional_writes = ("metadata",)
+    skip_writes: FrozenSet[str] = frozenset()
+
     def process(self, data: Any) -> Any:
         if not isinstance(data, dict):
             raise ValueError("SafeTransformStage expects dict context")
 
-        data["metadata"] = {"timestamp": time.time(), "enriched": True}
+        if "metadata" not in self.skip_writes:
+            data["metadata"] = {"timestamp": time.time(), "enriched": True}
         parsed = data.get("parsed")
         kind = data.get("kind")
 
@@ -399,6 +4521,10 @@ if __name__ == "__main__":
     manager.register(csv_pipeline)
     manager.register(stream_pipeline)
 
+    console = ConsoleTraceSink()
+    for pipeline in (json_pipeline, csv_pipeline, stream_pipeline):
+        pipeline.set_trace(console)
+
     print()
     print("=== Multi-Format Data Processing ===")
     print()
@@ -425,15 +4551,15 @@ if __name__ == "__main__":
     print("Data flow: Raw -> Processed -> Analyzed -> Stored")
 
     chain_ids = ["PIPE_JSON", "PIPE_JSON", "PIPE_JSON"]
+    json_pipeline.set_trace(NULL_TRACE)
     start = time.perf_counter()
 
-    with redirect_stdout(io.StringIO()):
-        for i in range(100):
-            ctx = {
-                "kind": "json",
-                "raw": "record",
-                "parsed": {"sensor": "temp", "value": 20 + i, "unit": "C"},
-            }
+    for i in range(100):
+        ctx = {
+            "kind": "json",
+            "raw": "record",
+            "parsed": {"sensor": "temp", "value": 20 + i, "unit": "C"},
+        }
         manager.chain_context(chain_ids, ctx)
 
     dt = time.perf_counter() - start